@@ -1,9 +1,11 @@
 import streamlit as st
-import pandas as pd
 import os
 from datetime import datetime
-import json
 import time
+import copy
+from bili_spider.cache import DataCache, attach_store, load_following, load_user_frame
+from bili_spider.following import following_lock, read_following, write_following
+from bili_spider.store import get_store
 
 st.set_page_config(
     page_title="Bilibili Video Tracker",
@@ -11,19 +13,60 @@ st.set_page_config(
     layout="wide"
 )
 
-if 'following_users' not in st.session_state:
-    if os.path.exists('data/following.json'):
-        with open('data/following.json', 'r', encoding='utf-8') as f:
-            st.session_state.following_users = json.load(f)
-    else:
-        st.session_state.following_users = {}
+@st.cache_resource
+def get_data_cache():
+    cache = DataCache(max_bytes=int(os.environ.get('BILI_CACHE_MB', 256)) * 1024 * 1024)
+    attach_store(cache, get_store())
+    return cache
+
+# The update worker writes last_updated to following.json from another process,
+# so sessions pick up a new copy whenever the file changes
+following_source = load_following(get_data_cache())
+if st.session_state.get('following_source') is not following_source:
+    # The cached dict is shared between sessions; each session edits its own copy
+    st.session_state.following_users = copy.deepcopy(following_source)
+    st.session_state.following_source = following_source
+
+# BILI_LEAN_BROWSER=1 starts Chrome without images, fonts, media or trackers
+LEAN_BROWSER = os.environ.get('BILI_LEAN_BROWSER') == '1'
+# BILI_TABBED_BROWSER=1 runs the update worker's sessions as tabs of one Chrome
+TABBED_BROWSER = os.environ.get('BILI_TABBED_BROWSER') == '1'
+
+@st.cache_resource
+def get_browser_pool():
+    from bili_spider.spider import BrowserPool
+    chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
+    return BrowserPool(size=1, executable_path=chromedriver_path, lean=LEAN_BROWSER)
+
+@st.cache_resource
+def get_job_queue():
+    from bili_spider.jobs import JobQueue
+    return JobQueue()
+
+def queue_updates(user_ids, workers=1):
+    from bili_spider.jobs import ensure_worker
+    queue = get_job_queue()
+    for user_id in user_ids:
+        queue.enqueue(user_id, st.session_state.following_users[user_id]['name'])
+    ensure_worker(queue, workers=workers, lean=LEAN_BROWSER, tabs=TABBED_BROWSER)
 
 def save_following():
-    os.makedirs('data', exist_ok=True)
-    with open('data/following.json', 'w', encoding='utf-8') as f:
-        json.dump(st.session_state.following_users, f, ensure_ascii=False, indent=2)
+    # The worker may have stamped last_updated since we loaded; keep the newer stamps
+    with following_lock():
+        on_disk = read_following()
+        for user_id, user_info in st.session_state.following_users.items():
+            stamp = on_disk.get(user_id, {}).get('last_updated')
+            if stamp and stamp > (user_info.get('last_updated') or ''):
+                user_info['last_updated'] = stamp
+        write_following(st.session_state.following_users)
+
+page = st.sidebar.selectbox("选择页面", ["关注列表", "视频浏览", "全局搜索", "全部动态"])
 
-page = st.sidebar.selectbox("选择页面", ["关注列表", "视频浏览"])
+with st.sidebar.expander("🛠 调试信息"):
+    cache_stats = get_data_cache().stats()
+    st.text(f"缓存命中率: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})")
+    st.text(f"缓存条目: {cache_stats['entries']}, 占用 {cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+    st.text(f"过期: {cache_stats['stale']}, 失效: {cache_stats['invalidations']}, 淘汰: {cache_stats['evictions']}")
 
 if page == "关注列表":
     st.title("🌟 我的关注列表")
@@ -41,9 +84,7 @@ if page == "关注列表":
                     if new_user_id not in st.session_state.following_users:
                         with st.spinner(f"正在获取用户 {new_user_id} 的信息..."):
                             from bili_spider.spider import get_user_nickname
-                            # Try to get chromedriver path
-                            chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
-                            nickname = get_user_nickname(int(new_user_id), executable_path=chromedriver_path)
+                            nickname = get_user_nickname(int(new_user_id), pool=get_browser_pool())
                         
                         st.session_state.following_users[new_user_id] = {
                             "name": nickname,
@@ -57,15 +98,46 @@ if page == "关注列表":
                         st.warning("该用户已在关注列表中")
                 else:
                     st.error("请输入用户ID")
+
+        with st.expander("📥 批量导入"):
+            bulk_text = st.text_area("每行一个用户ID或空间链接", placeholder="927587\nhttps://space.bilibili.com/700380991")
+            bulk_file = st.file_uploader("或上传文本文件", type=["txt", "csv"])
+            if st.button("导入"):
+                from bili_spider.bulk_import import add_users, parse_mids, resolve_nicknames
+                from bili_spider.fetch import HttpBackend
+                from bili_spider.ratelimit import RateLimiter
+
+                text = bulk_text
+                if bulk_file is not None:
+                    text += "\n" + bulk_file.getvalue().decode('utf-8', errors='ignore')
+                mids = [mid for mid in parse_mids(text) if mid not in st.session_state.following_users]
+
+                if mids:
+                    import_progress = st.progress(0)
+                    import_status = st.empty()
+
+                    def on_resolved(done, total):
+                        import_progress.progress(done / total)
+                        import_status.text(f"正在获取昵称: {done}/{total}")
+
+                    # Same pace as python -m bili_spider.bulk_import
+                    backend = HttpBackend(rate_limiter=RateLimiter(rate_per_minute=60, burst=8), maxsize=8)
+                    try:
+                        names = resolve_nicknames(mids, backend=backend, pool=get_browser_pool(), workers=8,
+                                                  on_resolved=on_resolved)
+                    finally:
+                        backend.close()
+                    added = add_users(st.session_state.following_users, names)
+                    save_following()
+                    st.success(f"已添加 {len(added)} 个用户")
+                    st.rerun()
+                else:
+                    st.warning("没有找到新的用户ID")
     
     st.divider()
     
     st.subheader("📋 当前关注列表")
 
-    # Initialize session state for tracking update
-    if 'updating_user' not in st.session_state:
-        st.session_state.updating_user = None
-
     if st.session_state.following_users:
         # Create table header
         header_cols = st.columns([2, 3, 2, 2, 1, 1])
@@ -82,6 +154,9 @@ if page == "关注列表":
 
         st.divider()
 
+        # Counts come from the store's manifest, so no video data is read here
+        manifest = get_store().manifest()
+
         # Display user rows
         for user_id, user_info in st.session_state.following_users.items():
             col1, col2, col3, col4, col5, col6 = st.columns([2, 3, 2, 2, 1, 1])
@@ -93,10 +168,8 @@ if page == "关注列表":
                 st.text(f"{user_info['name']}")
 
             with col3:
-                csv_file = f"data/{user_id}.csv"
-                if os.path.exists(csv_file):
-                    df = pd.read_csv(csv_file)
-                    st.text(f"{len(df)}")
+                if user_id in manifest:
+                    st.text(f"{manifest[user_id]['video_count']}")
                 else:
                     st.text("未同步")
 
@@ -108,139 +181,144 @@ if page == "关注列表":
 
             with col5:
                 if st.button("🔄", key=f"update_{user_id}", help="更新该用户"):
-                    st.session_state.updating_user = user_id
+                    queue_updates([user_id])
+                    st.rerun()
 
             with col6:
                 if st.button("🗑", key=f"del_{user_id}", help="删除该用户"):
                     del st.session_state.following_users[user_id]
                     save_following()
-                    if os.path.exists(f"data/{user_id}.csv"):
-                        os.remove(f"data/{user_id}.csv")
-                    st.rerun()
-
-        # Update status area below the table
-        if st.session_state.updating_user:
-            st.divider()
-            user_id = st.session_state.updating_user
-            user_info = st.session_state.following_users[user_id]
-
-            # Create a container for update status
-            status_container = st.container()
-            with status_container:
-                st.info(f"🔄 正在更新: {user_info['name']} (ID: {user_id})")
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-
-                from bili_spider.updater import update_user_videos
-                chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
-
-                def progress_callback(current_page, total_pages, message):
-                    progress = current_page / total_pages if total_pages > 0 else 0
-                    progress_bar.progress(progress)
-                    status_text.text(f"{message}")
-
-                try:
-                    new_count = update_user_videos(
-                        user_id,
-                        user_info['name'],
-                        chromedriver_path=chromedriver_path,
-                        progress_callback=progress_callback
-                    )
-                    user_info['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    save_following()
-                    st.success(f"✅ {user_info['name']} 更新完成，新增 {new_count} 个视频")
-                    st.session_state.updating_user = None
-                    time.sleep(2)
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"❌ 更新失败: {str(e)}")
-                    st.session_state.updating_user = None
-                    time.sleep(3)
+                    get_store().delete_user(user_id)
                     st.rerun()
     else:
         st.info("还没有关注任何用户，请在上方添加")
     
     st.divider()
 
-    # Initialize session state for batch update
-    if 'updating_all' not in st.session_state:
-        st.session_state.updating_all = False
+    batch_workers = st.number_input("并发数", min_value=1, max_value=8, value=1, help="后台更新进程同时更新的用户数，每个用户使用独立浏览器；总请求速率保持不变")
 
-    if st.button("🔄 更新所有用户视频", type="primary", disabled=st.session_state.updating_all or bool(st.session_state.get('updating_user'))):
-        st.session_state.updating_all = True
+    if st.button("🔄 更新所有用户视频", type="primary", disabled=not st.session_state.following_users):
+        queue_updates(list(st.session_state.following_users), workers=batch_workers)
         st.rerun()
 
-    # Batch update progress area
-    if st.session_state.updating_all:
+    # Updates run in a separate worker process; this only shows the job table,
+    # so the page stays usable and a refresh doesn't stop anything
+    queue = get_job_queue()
+    jobs = queue.jobs(limit=20)
+    if jobs:
         st.divider()
+        st.markdown("### 📊 更新任务")
 
-        # Create a clean progress display area
-        with st.container():
-            st.markdown("### 📊 批量更新进度")
-
-            from bili_spider.updater import update_user_videos
-            total_users = len(st.session_state.following_users)
-            chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
-
-            # Overall progress
-            overall_progress = st.progress(0)
-            overall_status = st.empty()
-
-            # Current user progress
-            with st.expander("当前用户进度", expanded=True):
-                current_user_info = st.empty()
-                user_progress = st.progress(0)
-                user_status = st.empty()
-
-            # Results summary
-            results_container = st.container()
-            success_count = 0
-            failed_users = []
-
-            for idx, (user_id, user_info) in enumerate(st.session_state.following_users.items()):
-                # Update overall progress
-                overall_progress.progress((idx) / total_users)
-                overall_status.text(f"总进度: {idx + 1}/{total_users} 用户")
-                current_user_info.info(f"🔄 正在更新: {user_info['name']} (ID: {user_id})")
-
-                def progress_callback(current_page, total_pages, message):
-                    progress = current_page / total_pages if total_pages > 0 else 0
-                    user_progress.progress(progress)
-                    user_status.text(f"{message}")
-
-                try:
-                    new_count = update_user_videos(
-                        user_id,
-                        user_info['name'],
-                        chromedriver_path=chromedriver_path,
-                        progress_callback=progress_callback
-                    )
-
-                    user_info['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    save_following()
-
-                    with results_container:
-                        st.success(f"✅ {user_info['name']}: 新增 {new_count} 个视频")
-                    success_count += 1
-
-                except Exception as e:
-                    with results_container:
-                        st.error(f"❌ {user_info['name']}: {str(e)}")
-                    failed_users.append(user_info['name'])
-
-                # Reset current user progress
-                user_progress.progress(0)
-                user_status.text("")
+        for job in jobs:
+            col1, col2 = st.columns([2, 5])
+            with col1:
+                st.text(f"{job['user_name']} (ID: {job['user_id']})")
+            with col2:
+                if job['status'] == 'queued':
+                    st.text("⏳ 排队中")
+                elif job['status'] == 'running':
+                    progress = job['current_page'] / job['total_pages'] if job['total_pages'] > 0 else 0
+                    st.progress(min(progress, 1.0))
+                    st.text(job['message'] or "🔄 正在启动...")
+                elif job['status'] == 'done':
+                    st.success(f"✅ 新增 {job['new_count']} 个视频")
+                else:
+                    st.error(f"❌ {job['error']}")
+
+        active_count = queue.active_count()
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            if st.button("清除已完成任务"):
+                queue.clear_finished()
+                st.rerun()
+        with col2:
+            if active_count and not queue.live_workers():
+                if st.button("启动后台更新进程"):
+                    queue_updates([], workers=batch_workers)
+                    st.rerun()
 
-            # Final summary
-            overall_progress.progress(1.0)
-            overall_status.text(f"✅ 更新完成！成功: {success_count}/{total_users}")
+        if active_count:
+            # Poll the job table until the queue drains
+            time.sleep(2)
+            st.rerun()
 
-            if failed_users:
-                st.warning(f"以下用户更新失败: {', '.join(failed_users)}")
+elif page == "全局搜索":
+    st.title("🔎 全局搜索")
+
+    query = st.text_input("搜索所有关注用户的视频标题", placeholder="例如：线性代数 MIT")
+    limit = st.selectbox("最多显示", [50, 200, 1000], index=0)
+
+    if query:
+        started = time.time()
+        results = get_store().search(query, limit=limit)
+        elapsed_ms = (time.time() - started) * 1000
+
+        if len(results) > 0:
+            st.text(f"找到 {len(results)} 个视频 ({elapsed_ms:.0f} ms)")
+            names = {user_id: info['name'] for user_id, info in st.session_state.following_users.items()}
+            results['user'] = results['user_id'].map(names).fillna(results['user_name'])
+            st.dataframe(
+                results[['title', 'user', 'url', 'play_count', 'duration', 'pub_date']],
+                column_config={
+                    'title': "标题",
+                    'user': "UP主",
+                    'url': st.column_config.LinkColumn("链接"),
+                    'play_count': "播放",
+                    'duration': "时长",
+                    'pub_date': "发布时间",
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+        else:
+            st.info("没有找到匹配的视频")
+
+elif page == "全部动态":
+    from bili_spider.timeline import mark_visit, timeline_page
+
+    st.title("🗞 全部动态")
+
+    # The previous visit is read once per session, before this visit is recorded
+    if 'feed_last_visit' not in st.session_state:
+        st.session_state.feed_last_visit = mark_visit()
+    if 'feed_cursors' not in st.session_state:
+        st.session_state.feed_cursors = [None]
+
+    last_visit = st.session_state.feed_last_visit
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        only_new = st.checkbox(f"只看上次访问后发布的视频 ({last_visit or '首次访问'})", value=False,
+                               disabled=last_visit is None, on_change=lambda: st.session_state.update(feed_cursors=[None]))
+    with col2:
+        feed_size = st.selectbox("每页显示", [20, 50, 100], index=1,
+                                 on_change=lambda: st.session_state.update(feed_cursors=[None]))
+
+    videos, next_before = timeline_page(get_store(), limit=feed_size,
+                                        since=last_visit if only_new else None,
+                                        before=st.session_state.feed_cursors[-1])
+
+    if videos:
+        names = {user_id: info['name'] for user_id, info in st.session_state.following_users.items()}
+        st.text(f"第 {len(st.session_state.feed_cursors)} 页")
+        for video in videos:
+            col1, col2, col3 = st.columns([5, 2, 2])
+            with col1:
+                st.markdown(f"**[{video['title']}]({video['url']})**")
+            with col2:
+                st.text(names.get(video['user_id'], video['user_name']))
+            with col3:
+                st.text(video['pub_ts'][:16])
+    else:
+        st.info("暂无视频")
 
-            st.session_state.updating_all = False
-            time.sleep(3)
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        if st.button("⬅ 上一页", disabled=len(st.session_state.feed_cursors) == 1):
+            st.session_state.feed_cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("下一页 ➡", disabled=next_before is None):
+            st.session_state.feed_cursors.append(next_before)
             st.rerun()
 
 else:
@@ -259,33 +337,19 @@ else:
             user_info = st.session_state.following_users[selected_user_id]
             st.subheader(f"🎬 {user_info['name']} 的视频列表")
             
-            csv_file = f"data/{selected_user_id}.csv"
-            
-            if os.path.exists(csv_file):
-                df = pd.read_csv(csv_file)
+            if get_store().has_user(selected_user_id):
+                # Only filtered and sorted below, never modified, so the cached frame is used as is
+                df = load_user_frame(get_data_cache(), get_store(), selected_user_id)
                 
                 col1, col2, col3 = st.columns([1, 1, 1])
                 with col1:
                     st.metric("视频总数", len(df))
                 with col2:
-                    if 'pub_date' in df.columns:
-                        try:
-                            # Parse dates with current year for MM-DD format
-                            current_year = datetime.now().year
-                            df['pub_date_parsed'] = df['pub_date'].apply(lambda x: 
-                                pd.to_datetime(f"{current_year}-{x}" if '-' in str(x) and len(str(x).split('-')[0]) <= 2 else x, errors='coerce')
-                            )
-                            valid_dates = df['pub_date_parsed'].dropna()
-                            if len(valid_dates) > 0:
-                                latest_date = valid_dates.max()
-                                # If the date is in the future (due to MM-DD assumption), use previous year
-                                if latest_date > datetime.now():
-                                    latest_date = latest_date.replace(year=current_year - 1)
-                                st.metric("最新视频", latest_date.strftime("%Y-%m-%d"))
-                            else:
-                                st.metric("最新视频", "暂无数据")
-                        except Exception as e:
-                            st.metric("最新视频", "日期解析失败")
+                    latest_ts = df['pub_ts'].dropna().max() if len(df) else None
+                    if isinstance(latest_ts, str):
+                        st.metric("最新视频", latest_ts[:10])
+                    else:
+                        st.metric("最新视频", "暂无数据")
                 with col3:
                     if user_info.get('last_updated'):
                         st.metric("上次更新", user_info['last_updated'][:10])
@@ -294,89 +358,78 @@ else:
                 
                 search_term = st.text_input("🔍 搜索视频标题", placeholder="输入关键词...")
                 
-                filtered_df = df.copy()
+                filtered_df = df
                 if search_term:
                     filtered_df = filtered_df[filtered_df['title'].str.contains(search_term, case=False, na=False)]
                 
                 sort_by = st.selectbox("排序方式", ["发布时间(新到旧)", "发布时间(旧到新)", "播放量(高到低)", "播放量(低到高)"])
                 
+                # pub_ts / play_count_int are normalized when videos are stored
                 if sort_by == "发布时间(新到旧)":
-                    # Parse dates with current year for MM-DD format
-                    current_year = datetime.now().year
-                    filtered_df['pub_date_parsed'] = filtered_df['pub_date'].apply(lambda x: 
-                        pd.to_datetime(f"{current_year}-{x}" if '-' in str(x) and len(str(x).split('-')[0]) <= 2 else x, errors='coerce')
-                    )
-                    filtered_df = filtered_df.sort_values('pub_date_parsed', ascending=False)
+                    filtered_df = filtered_df.sort_values('pub_ts', ascending=False, na_position='last')
                 elif sort_by == "发布时间(旧到新)":
-                    # Parse dates with current year for MM-DD format
-                    current_year = datetime.now().year
-                    filtered_df['pub_date_parsed'] = filtered_df['pub_date'].apply(lambda x: 
-                        pd.to_datetime(f"{current_year}-{x}" if '-' in str(x) and len(str(x).split('-')[0]) <= 2 else x, errors='coerce')
-                    )
-                    filtered_df = filtered_df.sort_values('pub_date_parsed', ascending=True)
+                    filtered_df = filtered_df.sort_values('pub_ts', ascending=True, na_position='last')
                 elif sort_by == "播放量(高到低)":
-                    def parse_play_count(x):
-                        x_str = str(x)
-                        if '充电专属' in x_str or '专属' in x_str:
-                            return 0  # Special content, treat as 0
-                        try:
-                            if '万' in x_str:
-                                return float(x_str.replace('万', '').replace('-', '0')) * 10000
-                            else:
-                                return float(x_str.replace('-', '0'))
-                        except:
-                            return 0  # If parsing fails, treat as 0
-                    
-                    filtered_df['play_count_num'] = filtered_df['play_count'].apply(parse_play_count)
-                    filtered_df = filtered_df.sort_values('play_count_num', ascending=False)
+                    filtered_df = filtered_df.sort_values('play_count_int', ascending=False)
                 elif sort_by == "播放量(低到高)":
-                    def parse_play_count(x):
-                        x_str = str(x)
-                        if '充电专属' in x_str or '专属' in x_str:
-                            return 0  # Special content, treat as 0
-                        try:
-                            if '万' in x_str:
-                                return float(x_str.replace('万', '').replace('-', '0')) * 10000
-                            else:
-                                return float(x_str.replace('-', '0'))
-                        except:
-                            return 0  # If parsing fails, treat as 0
-                    
-                    filtered_df['play_count_num'] = filtered_df['play_count'].apply(parse_play_count)
-                    filtered_df = filtered_df.sort_values('play_count_num', ascending=True)
+                    filtered_df = filtered_df.sort_values('play_count_int', ascending=True)
                 
                 st.divider()
                 
                 if len(filtered_df) > 0:
-                    st.text(f"找到 {len(filtered_df)} 个视频")
-                    
-                    for idx, row in filtered_df.iterrows():
-                        with st.container():
-                            col1, col2, col3, col4 = st.columns([5, 2, 2, 1])
-                            
-                            with col1:
-                                st.markdown(f"**[{row['title']}]({row['url']})**")
-                            
-                            with col2:
-                                st.text(f"播放: {row['play_count']}")
-                            
-                            with col3:
-                                st.text(f"时长: {row['duration']}")
-                            
-                            with col4:
-                                st.text(row['pub_date'])
-                            
-                            st.divider()
+                    col1, col2, col3 = st.columns([1, 1, 1])
+                    with col1:
+                        page_size = st.selectbox("每页显示", [20, 50, 100, 200], index=1)
+                    total_pages = (len(filtered_df) - 1) // page_size + 1
+                    with col2:
+                        # Keyed on the view so a new search, sort or user starts from page 1
+                        page_number = st.number_input("跳转到页", min_value=1, max_value=total_pages, value=1, step=1,
+                                               key=f"video_page_{selected_user_id}_{search_term}_{sort_by}_{page_size}")
+                    with col3:
+                        compact = st.toggle("紧凑表格模式", value=False)
+
+                    start = (int(page_number) - 1) * page_size
+                    page_df = filtered_df.iloc[start:start + page_size]
+                    st.text(f"找到 {len(filtered_df)} 个视频，第 {int(page_number)}/{total_pages} 页 "
+                            f"({start + 1}-{start + len(page_df)})")
+
+                    # Only the current page is rendered, so reruns cost the same however many videos a user has
+                    if compact:
+                        st.dataframe(
+                            page_df[['title', 'url', 'play_count', 'duration', 'pub_date']],
+                            column_config={
+                                'title': "标题",
+                                'url': st.column_config.LinkColumn("链接"),
+                                'play_count': "播放",
+                                'duration': "时长",
+                                'pub_date': "发布时间",
+                            },
+                            hide_index=True,
+                            use_container_width=True,
+                        )
+                    else:
+                        for row in page_df.itertuples(index=False):
+                            with st.container():
+                                col1, col2, col3, col4 = st.columns([5, 2, 2, 1])
+
+                                with col1:
+                                    st.markdown(f"**[{row.title}]({row.url})**")
+
+                                with col2:
+                                    st.text(f"播放: {row.play_count}")
+
+                                with col3:
+                                    st.text(f"时长: {row.duration}")
+
+                                with col4:
+                                    st.text(row.pub_date)
+
+                                st.divider()
                 else:
                     st.info("没有找到匹配的视频")
                 
             else:
                 st.warning(f"用户 {user_info['name']} 的视频数据尚未同步")
                 if st.button("立即同步该用户"):
-                    from bili_spider.updater import update_user_videos
-                    with st.spinner("正在获取视频数据..."):
-                        update_user_videos(selected_user_id, user_info['name'])
-                        user_info['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        save_following()
-                    st.success("同步完成！")
-                    st.rerun()
\ No newline at end of file
+                    queue_updates([selected_user_id])
+                    st.success("已加入后台更新队列，可在关注列表页面查看进度")
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Offline throughput benchmark: async crawler vs threaded HTTP updater.
+
+Starts the local stub API with a per-response latency, crawls a set of fake
+users into a scratch data directory with each engine and reports users/min
+and pages/min. Run from the repository root:
+
+    python -m benchmarks.bench_async_crawl --users 50 --videos 300 --latency 0.2
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from bili_spider.async_spider import update_all_users_async
+from bili_spider.fetch import HttpBackend
+from bili_spider.ratelimit import RateLimiter
+from bili_spider.stub_server import StubServer
+from bili_spider.updater import update_all_users
+
+
+def fake_following(count):
+    return {str(100000 + i): {'name': f"User_{100000 + i}", 'added_at': None, 'last_updated': None} for i in range(count)}
+
+
+def run(engine, server, args):
+    workdir = tempfile.mkdtemp(prefix='bili-bench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.makedirs('data')
+    try:
+        following = fake_following(args.users)
+        if engine == 'async':
+            summary = update_all_users_async(following, concurrency=args.concurrency, requests_per_minute=args.rpm,
+                                             per_host=args.concurrency, base_url=server.base_url)
+        else:
+            backend = HttpBackend(base_url=server.base_url, rate_limiter=RateLimiter(args.rpm, burst=args.workers),
+                                  maxsize=args.workers)
+            summary = update_all_users(following, workers=args.workers, backend=backend)
+            backend.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--videos', type=int, default=300, help="videos per fake user")
+    parser.add_argument('--latency', type=float, default=0.2, help="stub response latency in seconds")
+    parser.add_argument('--concurrency', type=int, default=32, help="async users in flight")
+    parser.add_argument('--workers', type=int, default=4, help="threaded updater workers")
+    parser.add_argument('--rpm', type=int, default=100000, help="request budget; high by default to measure the engine")
+    parser.add_argument('--engines', default='async,threaded')
+    args = parser.parse_args()
+
+    with StubServer(synthetic_videos=args.videos, latency=args.latency) as server:
+        rows = []
+        for engine in args.engines.split(','):
+            summary = run(engine, server, args)
+            rows.append((engine, summary))
+
+    print()
+    print(f"{'engine':<10} {'users':>6} {'failed':>6} {'pages':>6} {'seconds':>8} {'users/min':>10} {'pages/min':>10}")
+    for engine, s in rows:
+        print(f"{engine:<10} {s['users']:>6} {s['failed']:>6} {s['pages']:>6} {s['seconds']:>8.1f} "
+              f"{s['users_per_min']:>10.1f} {s['pages_per_min']:>10.1f}")
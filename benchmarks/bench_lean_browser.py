@@ -0,0 +1,60 @@
+"""Page-ready time, bytes transferred and Chrome RSS with and without lean mode.
+
+Loads each user's space video page in a normal and then a lean Chrome
+session and waits for the card list the way get_user_videos does. Bytes
+are summed from the Resource Timing API, which reports 0 for cross-origin
+responses without Timing-Allow-Origin, so treat them as a lower bound.
+Needs Chrome and network access. Run from the repository root:
+
+    python -m benchmarks.bench_lean_browser 927587 700380991 --rounds 3
+"""
+import argparse
+import os
+import statistics
+import time
+
+from bili_spider.spider import api_user, chrome_rss_mb, make_chrome_browser
+from bili_spider.waits import wait_for_page_state
+
+TRANSFER_JS = '''
+return performance.getEntriesByType('navigation')
+    .concat(performance.getEntriesByType('resource'))
+    .reduce((total, entry) => total + (entry.transferSize || 0), 0);
+'''
+
+
+def measure(mids, rounds, lean, executable_path=None, pause=1.0):
+    ready, transferred, rss = [], [], []
+    with make_chrome_browser(executable_path=executable_path, lean=lean) as browser:
+        for _ in range(rounds):
+            for mid in mids:
+                started = time.perf_counter()
+                browser.get(api_user.format(mid))
+                state = wait_for_page_state(browser)
+                ready.append(time.perf_counter() - started)
+                transferred.append(browser.execute_script(TRANSFER_JS) or 0)
+                rss.append(chrome_rss_mb(browser) or 0.0)
+                if state != 'cards':
+                    print(f"  {mid}: page state {state!r}")
+                time.sleep(pause)
+    return ready, transferred, rss
+
+
+def quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mids', nargs='+', help="users whose space pages are loaded")
+    parser.add_argument('--rounds', type=int, default=3, help="times each page is loaded per mode")
+    parser.add_argument('--pause', type=float, default=1.0, help="seconds between page loads")
+    args = parser.parse_args()
+
+    chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
+    print(f"{'mode':<8} {'ready p50':>10} {'ready p90':>10} {'KB/page':>9} {'RSS max MB':>11}")
+    for lean in (False, True):
+        ready, transferred, rss = measure(args.mids, args.rounds, lean, chromedriver_path, args.pause)
+        print(f"{'lean' if lean else 'normal':<8} {statistics.median(ready):>9.2f}s {quantile(ready, 0.9):>9.2f}s "
+              f"{statistics.mean(transferred) / 1024:>9.0f} {max(rss):>11.0f}")
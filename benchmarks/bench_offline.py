@@ -0,0 +1,218 @@
+"""Offline benchmark suite: the spider's hot paths against fixture pages, no Chrome or network.
+
+Times parse_videos_on_page and get_total_pages on each fixture layout,
+full get_user_videos pagination through FakeDriver, HttpBackend paging
+against the local StubServer, and update_user_videos merging 30 new videos
+into a store already holding 1k/10k/100k. Each benchmark reports the
+median and best of --repeat runs. --save writes the results as JSON and
+--compare checks a run against saved results, exiting non-zero when
+anything got slower by more than --tolerance. Run from the repository root:
+
+    python -m benchmarks.bench_offline --save benchmarks/results/baseline.json
+    python -m benchmarks.bench_offline --compare benchmarks/results/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bili_spider.fetch import HttpBackend, video_url
+from bili_spider.parsers import DEFAULT_PARSER
+from bili_spider.spider import get_total_pages, get_user_videos, parse_videos_on_page
+from bili_spider.store import get_store
+from bili_spider.stub_server import StubServer
+from bili_spider.updater import update_user_videos
+from bili_spider.waits import PacingPolicy
+
+from .fakes import FakeDriver, FakeSite, ListBackend, fake_bvid, load_fixtures
+
+
+def measure(fn, repeat, setup=None, min_run=0.2):
+    """Seconds per call of `fn`, median and best of `repeat` runs after an untimed warm-up.
+
+    Without `setup`, each run loops `fn` enough times to last about
+    `min_run` seconds, so millisecond calls aren't lost in timer noise.
+    With it, `setup` runs untimed before every single call.
+    """
+    number = 1
+    if setup is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn()
+            once = time.perf_counter() - started
+        number = max(1, int(min_run / once)) if once > 0 else 1
+    times = []
+    for i in range(repeat + (1 if setup else 0)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = 0.0
+            for _ in range(number):
+                if setup:
+                    setup()
+                started = time.perf_counter()
+                fn()
+                elapsed += time.perf_counter() - started
+        if i or not setup:
+            times.append(elapsed / number)
+    return {'median': statistics.median(times), 'min': min(times), 'runs': len(times), 'number': number}
+
+
+def quiet(*args):
+    pass
+
+
+def bench_pages(results, repeat, pages):
+    fixtures = load_fixtures()
+    for layout in fixtures:
+        site = FakeSite(1000, 3, layout=layout, fixtures=fixtures)
+        driver = FakeDriver([site])
+        driver.get('https://space.bilibili.com/1000/video')
+        results[f'parse_videos_on_page/{layout}'] = measure(lambda: parse_videos_on_page(driver, 'bench'), repeat)
+        results[f'get_total_pages/{layout}'] = measure(lambda: get_total_pages(driver), repeat)
+
+    site = FakeSite(1001, pages, fixtures=fixtures)
+    driver = FakeDriver([site])
+
+    def crawl():
+        videos = list(get_user_videos(driver, 1001, progress_callback=quiet, pacing=PacingPolicy.none()))
+        assert len(videos) == pages * site.per_page, len(videos)
+
+    results[f'get_user_videos/{pages}_pages'] = measure(crawl, repeat)
+
+
+def bench_http(results, repeat, videos):
+    with StubServer(synthetic_videos=videos) as server:
+        backend = HttpBackend(base_url=server.base_url, pacing=PacingPolicy.none())
+        try:
+            def crawl():
+                assert sum(1 for _ in backend.iter_videos(2000)) == videos
+
+            results[f'http_iter_videos/{videos}_videos'] = measure(crawl, repeat)
+        finally:
+            backend.close()
+
+
+def seed_store(user_id, count, chunk_size=10000):
+    """`count` stored videos for a user, one a day going back from 2020-01-01, newest first"""
+    start = datetime(2020, 1, 1)
+    for offset in range(0, count, chunk_size):
+        rows = []
+        for i in range(offset, min(count, offset + chunk_size)):
+            bvid = fake_bvid(user_id, i)
+            rows.append({'url': video_url.format(bvid), 'bvid': bvid, 'user_name': 'bench', 'title': f"存量视频 {i}",
+                         'play_count': str(i), 'pub_date': (start - timedelta(days=i)).strftime("%Y-%m-%d"),
+                         'duration': '10:00', 'fetched_at': '2020-01-01 00:00:00'})
+        get_store().upsert_videos(str(user_id), rows)
+
+
+def bench_merge(results, repeat, sizes, new_per_run=30):
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix='bili-bench-')
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        os.makedirs('data')
+        try:
+            user_id = 3000
+            with contextlib.redirect_stdout(io.StringIO()):
+                seed_store(user_id, size)
+            head = [(video_url.format(fake_bvid(user_id, i)), fake_bvid(user_id, i), 'bench', f"存量视频 {i}",
+                     str(i), (datetime(2020, 1, 1) - timedelta(days=i)).strftime("%Y-%m-%d"), '10:00')
+                    for i in range(10)]
+            batch = [0]
+            backend = ListBackend([])
+
+            def next_batch():
+                # Fresh bvids every run, all newer than anything stored
+                batch[0] += 1
+                new = [(video_url.format(f"BV1N{batch[0]:03d}{i:05d}"), f"BV1N{batch[0]:03d}{i:05d}", 'bench',
+                        f"新视频 {batch[0]}-{i}", '0', (datetime(2021, 1, 1) + timedelta(days=batch[0])).strftime("%Y-%m-%d"),
+                        '10:00') for i in range(new_per_run)]
+                backend.videos = new + head
+
+            def merge():
+                assert update_user_videos(str(user_id), 'bench', backend=backend) == new_per_run
+
+            results[f'update_user_videos/{size}_existing'] = measure(merge, repeat, setup=next_batch)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print each benchmark against the baseline; returns the names that got slower than `tolerance` allows"""
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<40} {'-':>10} {result['median'] * 1000:>8.2f}ms {'new':>8}")
+            continue
+        change = result['median'] / before['median'] - 1 if before['median'] else 0.0
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  SLOWER'
+        print(f"{name:<40} {before['median'] * 1000:>8.2f}ms {result['median'] * 1000:>8.2f}ms {change:>+7.0%}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--pages', type=int, default=20, help="pages in the get_user_videos pagination run")
+    parser.add_argument('--http-videos', type=int, default=300, help="videos served by the stub in the HTTP run")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="existing videos for the merge runs")
+    parser.add_argument('--only', help="run only the groups named here: pages, http, merge (comma-separated)")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="compare against results saved earlier with --save")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="slowdown allowed before --compare fails")
+    args = parser.parse_args()
+
+    groups = set(args.only.split(',')) if args.only else {'pages', 'http', 'merge'}
+    results = {}
+    if 'pages' in groups:
+        bench_pages(results, args.repeat, args.pages)
+    if 'http' in groups:
+        bench_http(results, args.repeat, args.http_videos)
+    if 'merge' in groups:
+        bench_merge(results, args.repeat, [int(size) for size in args.sizes.split(',')])
+
+    print(f"{'benchmark':<40} {'median':>10} {'best':>10}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['median'] * 1000:>8.2f}ms {result['min'] * 1000:>8.2f}ms")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'parser': DEFAULT_PARSER,
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmarks slower than the baseline by more than {args.tolerance:.0%}")
+            raise SystemExit(1)
@@ -0,0 +1,54 @@
+"""Pages/sec of each parse_html backend on the saved fixture pages.
+
+Checks every backend returns exactly what the bs4 reference parser returns
+before timing it. Run from the repository root:
+
+    python -m benchmarks.bench_parser --seconds 2
+"""
+import argparse
+import glob
+import os
+import time
+
+from bili_spider.parsers import PARSERS
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_fixtures():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, 'space_*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def pages_per_second(parse, page_source, seconds):
+    count = 0
+    started = time.perf_counter()
+    while True:
+        parse(page_source, 'bench')
+        count += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return count / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2.0, help="time spent per backend and page")
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    print(f"{'fixture':<24} {'backend':<12} {'cards':>6} {'pages/s':>9} {'speedup':>8}")
+    for name, page_source in pages.items():
+        reference = PARSERS['bs4'](page_source, 'bench')
+        baseline = None
+        for backend, parse in PARSERS.items():
+            result = parse(page_source, 'bench')
+            if result != reference:
+                print(f"{name:<24} {backend:<12} OUTPUT DIFFERS FROM bs4")
+                continue
+            rate = pages_per_second(parse, page_source, args.seconds)
+            baseline = baseline or rate
+            print(f"{name:<24} {backend:<12} {len(result):>6} {rate:>9.1f} {rate / baseline:>7.1f}x")
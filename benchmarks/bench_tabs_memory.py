@@ -0,0 +1,68 @@
+"""Chrome memory per concurrent crawl: one browser per crawl vs one tab per crawl.
+
+Runs the given users' crawls concurrently, first each in its own Chrome
+(BrowserPool) and then each in a tab of a single Chrome (TabbedBrowser),
+sampling the RSS of every Chrome involved while they run. chrome_rss_mb
+counts Chrome's process tree, not the chromedriver processes themselves,
+so the separate-browser numbers are if anything on the low side. Needs
+Chrome and network access. Run from the repository root:
+
+    python -m benchmarks.bench_tabs_memory 927587 700380991 546195 --pages 2
+"""
+import argparse
+import os
+import threading
+import time
+
+from bili_spider.spider import BrowserPool, TabbedBrowser, chrome_rss_mb, get_user_videos
+from bili_spider.waits import PacingPolicy
+
+
+def run(pool, mids, pages, sample_every=0.5):
+    """Crawl every mid at once through `pool`; returns (seconds, videos, peak RSS MB summed over browsers)"""
+    browsers = {}
+    counts = {}
+    done = threading.Event()
+    peak = [0.0]
+
+    def crawl(mid):
+        with pool.lease() as browser:
+            browsers[id(browser)] = browser
+            counts[mid] = sum(1 for _ in get_user_videos(browser, int(mid), max_pages=pages,
+                                                         progress_callback=lambda *a: None,
+                                                         pacing=PacingPolicy(between_pages=1.0, jitter=0.5)))
+
+    def sample():
+        while not done.wait(sample_every):
+            total = sum(chrome_rss_mb(browser) or 0.0 for browser in list(browsers.values()))
+            peak[0] = max(peak[0], total)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=crawl, args=(mid,)) for mid in mids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    return elapsed, sum(counts.values()), peak[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mids', nargs='+', help="users crawled concurrently, one crawl each")
+    parser.add_argument('--pages', type=int, default=2, help="pages read per user")
+    parser.add_argument('--lean', action='store_true', help="launch Chrome in lean mode for both runs")
+    args = parser.parse_args()
+
+    chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
+    concurrency = len(args.mids)
+    print(f"{'mode':<10} {'crawls':>6} {'seconds':>8} {'videos':>7} {'peak MB':>8} {'MB/crawl':>9}")
+    for mode, pool in (('browsers', BrowserPool(size=concurrency, executable_path=chromedriver_path, lean=args.lean)),
+                       ('tabs', TabbedBrowser(tabs=concurrency, executable_path=chromedriver_path, lean=args.lean))):
+        with pool:
+            elapsed, videos, peak = run(pool, args.mids, args.pages)
+        print(f"{mode:<10} {concurrency:>6} {elapsed:>8.1f} {videos:>7} {peak:>8.0f} {peak / concurrency:>9.0f}")
@@ -0,0 +1,108 @@
+"""Offline stand-ins for Chrome and the crawl backends, built on the saved fixture pages.
+
+FakeDriver is the replay driver (bili_spider.replay.SnapshotDriver) over
+FakeSites: users whose space pages are copies of one fixture layout with
+the bvids and page count rewritten, so every page has its own 30 videos.
+get_total_pages and click_next_page run their real code paths against
+it. The JSON API stand-in is bili_spider.stub_server.StubServer.
+"""
+import glob
+import os
+import re
+from contextlib import nullcontext
+
+from bs4 import BeautifulSoup
+
+from bili_spider.replay import SnapshotDriver
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+BVID_RE = re.compile(r'BV[0-9A-Za-z]{10}')
+PAGE_COUNT_RE = re.compile(r'共\s*\d+\s*页')
+
+
+def load_fixtures():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, 'space_*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages[os.path.basename(path)[len('space_'):-len('.html')]] = f.read()
+    return pages
+
+
+def fake_bvid(mid, index):
+    return f"BV1F{int(mid) % 1000:03d}{index:05d}"
+
+
+class FakeSite:
+    """The space pages of one user, `total_pages` pages of a fixture `layout`"""
+
+    def __init__(self, mid, total_pages, layout='new_layout', fixtures=None):
+        fixtures = fixtures or load_fixtures()
+        self.mid = int(mid)
+        self.total_pages = total_pages
+        self.template = fixtures[layout]
+        self.bvids = list(dict.fromkeys(BVID_RE.findall(self.template)))
+        self.title = re.search(r'<title>([^<]*)</title>', self.template).group(1)
+        self._pages = {}
+
+    @property
+    def per_page(self):
+        return len(self.bvids)
+
+    def page(self, pn):
+        if pn not in self._pages:
+            mapping = {bvid: fake_bvid(self.mid, (pn - 1) * self.per_page + i) for i, bvid in enumerate(self.bvids)}
+            html = BVID_RE.sub(lambda m: mapping.get(m.group(0), m.group(0)), self.template)
+            html = PAGE_COUNT_RE.sub(f"共 {self.total_pages} 页", html)
+            self._pages[pn] = (html, BeautifulSoup(html, 'html.parser'))
+        return self._pages[pn]
+
+    def first_bvid(self, pn):
+        return fake_bvid(self.mid, (pn - 1) * self.per_page) if self.bvids else None
+
+
+class FakeDriver(SnapshotDriver):
+    """Just enough of a Chrome WebDriver to run the spider against FakeSites"""
+
+    def __init__(self, sites):
+        super().__init__()
+        self.sites = {str(site.mid): site for site in sites}
+
+    def snapshot(self, key):
+        kind, mid, *pn = key.split('/')
+        site = self.sites.get(mid)
+        if site is None or (pn and not 1 <= int(pn[0]) <= site.total_pages):
+            return None
+        return {'title': site.title, 'html': site.page(int(pn[0]) if pn else 1)[0]}
+
+    def soup(self, key, html):
+        # Each FakeSite page is parsed once, so bs4 stays out of the timings
+        kind, mid, *pn = key.split('/')
+        return self.sites[mid].page(int(pn[0]) if pn else 1)[1]
+
+
+class FakePool:
+    """A BrowserPool that leases FakeDrivers over the same sites"""
+
+    def __init__(self, sites):
+        self.sites = sites
+
+    def lease(self):
+        return nullcontext(FakeDriver(self.sites))
+
+
+class ListBackend:
+    """A backend that streams a fixed newest-first list of video tuples, for timing the update path alone"""
+
+    name = 'list'
+
+    def __init__(self, videos):
+        self.videos = videos
+
+    def iter_videos(self, mid, max_pages=None, progress_callback=None, high_water_mark=None, start_page=1):
+        for video in self.videos:
+            if high_water_mark is not None and high_water_mark.reached(video):
+                return
+            yield video
+
+    def close(self):
+        pass
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlparse
+
+import aiohttp
+from yarl import URL
+
+from .fetch import FetchError, api_base, sign_wbi, user_agent, video_from_api
+from .following import save_last_updated
+from .ratelimit import AsyncRateLimiter
+from .spider import CrawlIncomplete, ResumeMismatch
+from .store import get_store
+from .updater import StagedCrawl, load_high_water_mark, summarize_results
+
+
+class AsyncHttpClient:
+    """asyncio counterpart of HttpBackend sharing one aiohttp connection pool.
+
+    Every request goes through a per-host semaphore (at most `per_host`
+    in flight to one host) and a shared token bucket, so many users can be
+    crawled at once without exceeding `requests_per_minute` in total.
+    """
+
+    def __init__(self, base_url=api_base, cookies=None, requests_per_minute=60, burst=4,
+                 per_host=4, total_connections=32, page_size=30, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = dict(cookies or {})
+        self.rate_limiter = AsyncRateLimiter(rate_per_minute=requests_per_minute, burst=burst)
+        self.per_host = per_host
+        self.total_connections = total_connections
+        self.page_size = page_size
+        self.timeout = timeout
+        self.session = None
+        self._host_semaphores = {}
+        self._setup_lock = asyncio.Lock()
+        self._wbi_keys = None
+        self._wbi_keys_at = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.total_connections, limit_per_host=self.per_host)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={
+                'User-Agent': user_agent,
+                'Referer': 'https://space.bilibili.com/',
+                'Origin': 'https://space.bilibili.com',
+            },
+        )
+        if self.cookies:
+            self.session.cookie_jar.update_cookies(self.cookies, response_url=URL(self.base_url))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def _request_json(self, path, params=None):
+        url = self.base_url + path
+        if params:
+            url += '?' + urlencode(params)
+        host = urlparse(url).netloc
+        semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+
+        async with semaphore:
+            await self.rate_limiter.acquire(host)
+            try:
+                async with self.session.get(url) as resp:
+                    if resp.status != 200:
+                        raise FetchError(f"HTTP {resp.status} from {path}", code=resp.status)
+                    body = await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise FetchError(f"Request to {path} failed: {e!r}")
+
+        try:
+            return json.loads(body.decode('utf-8'))
+        except ValueError:
+            raise FetchError(f"Invalid JSON from {path}")
+
+    async def _ensure_setup(self):
+        # Cookies and WBI keys are fetched once and shared by every coroutine
+        async with self._setup_lock:
+            if not any(c.key == 'buvid3' for c in self.session.cookie_jar):
+                try:
+                    payload = await self._request_json('/x/frontend/finger/spi')
+                    data = payload.get('data') or {}
+                    cookies = {k: data[v] for k, v in (('buvid3', 'b_3'), ('buvid4', 'b_4')) if data.get(v)}
+                    self.session.cookie_jar.update_cookies(cookies, response_url=URL(self.base_url))
+                except FetchError as e:
+                    print(f"Could not get buvid cookies: {e}")
+
+            if self._wbi_keys and time.time() - self._wbi_keys_at < 3600:
+                return self._wbi_keys
+            payload = await self._request_json('/x/web-interface/nav')
+            wbi_img = (payload.get('data') or {}).get('wbi_img') or {}
+            try:
+                img_key = wbi_img['img_url'].rsplit('/', 1)[1].split('.')[0]
+                sub_key = wbi_img['sub_url'].rsplit('/', 1)[1].split('.')[0]
+            except (KeyError, IndexError):
+                raise FetchError("Could not read WBI keys from nav response")
+            self._wbi_keys = (img_key, sub_key)
+            self._wbi_keys_at = time.time()
+            return self._wbi_keys
+
+    async def fetch_page(self, mid, pn=1, page_size=None):
+        img_key, sub_key = await self._ensure_setup()
+        params = sign_wbi({
+            'mid': int(mid),
+            'ps': page_size or self.page_size,
+            'pn': pn,
+            'order': 'pubdate',
+            'tid': 0,
+            'keyword': '',
+            'platform': 'web',
+        }, img_key, sub_key)
+        payload = await self._request_json('/x/space/wbi/arc/search', params)
+        if payload.get('code') != 0:
+            raise FetchError(f"API error {payload.get('code')}: {payload.get('message')}", code=payload.get('code'))
+        return payload.get('data') or {}
+
+
+async def crawl_user(client, user_id, user_name, progress_callback=None):
+    """Async update_user_videos: same duplicate rules, staging and checkpoints, pages read over HTTP"""
+    loop = asyncio.get_running_loop()
+    result = {'user_id': user_id, 'name': user_name, 'new_count': 0, 'pages': 0, 'seconds': 0.0, 'error': None}
+    started = time.perf_counter()
+
+    try:
+        store = get_store()
+        checkpoint = await loop.run_in_executor(None, store.checkpoint, user_id)
+        if checkpoint is not None:
+            try:
+                result['new_count'] = await _crawl_staged(client, user_id, user_name, progress_callback, result,
+                                                          checkpoint=checkpoint)
+            except ResumeMismatch as e:
+                print(f"Can't resume {user_name} ({e}), starting over")
+                await loop.run_in_executor(None, store.discard_staged, user_id)
+                checkpoint = None
+        if checkpoint is None:
+            result['new_count'] = await _crawl_staged(client, user_id, user_name, progress_callback, result)
+    except Exception as e:
+        result['error'] = str(e)
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+async def _crawl_staged(client, user_id, user_name, progress_callback, result, checkpoint=None):
+    loop = asyncio.get_running_loop()
+    # Store reads and writes go through the executor so they don't stall the other crawls
+    crawl = await loop.run_in_executor(None, StagedCrawl, user_id, user_name, checkpoint)
+    high_water_mark = await loop.run_in_executor(None, load_high_water_mark, user_id)
+
+    current_page = crawl.start_page
+    try:
+        data = await client.fetch_page(user_id, current_page)
+        count = (data.get('page') or {}).get('count', 0)
+        total_pages = max(1, math.ceil(count / client.page_size))
+
+        while current_page <= total_pages:
+            vlist = (data.get('list') or {}).get('vlist') or []
+            if not vlist and count:
+                # As in HttpBackend.iter_videos: the count says there's more, so we were cut off
+                raise CrawlIncomplete(user_id, current_page - 1, total_pages)
+            await loop.run_in_executor(None, crawl.page_started, current_page, total_pages)
+            result['pages'] = current_page
+            if progress_callback:
+                progress_callback(current_page, total_pages, f"正在读取第 {current_page}/{total_pages} 页")
+            keep_going = True
+            for item in vlist:
+                video = video_from_api(item)
+                if high_water_mark is not None and high_water_mark.reached(video):
+                    keep_going = False
+                    break
+                if not crawl.add(video):
+                    keep_going = False
+                    break
+            if not keep_going or current_page >= total_pages:
+                break
+            current_page += 1
+            data = await client.fetch_page(user_id, current_page)
+    except (CrawlIncomplete, FetchError):
+        # These only happen between pages, so every page started was read in full
+        await loop.run_in_executor(None, crawl.cut_short)
+        raise
+
+    return await loop.run_in_executor(None, crawl.finish)
+
+
+async def crawl_users(following_users, concurrency=16, on_result=None, **client_kwargs):
+    """Crawl all followed users concurrently; returns the same summary as update_all_users"""
+    semaphore = asyncio.Semaphore(concurrency)
+    save_lock = asyncio.Lock()
+    loop = asyncio.get_running_loop()
+    results = []
+    started = time.perf_counter()
+
+    def save_following():
+        save_last_updated(following_users)
+
+    async with AsyncHttpClient(**client_kwargs) as client:
+        async def run_one(user_id, user_info):
+            async with semaphore:
+                result = await crawl_user(client, user_id, user_info['name'])
+            results.append(result)
+            if result['error']:
+                print(f"Error updating {user_info['name']}: {result['error']}")
+            else:
+                user_info['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                async with save_lock:
+                    await loop.run_in_executor(None, save_following)
+            if on_result:
+                on_result(result)
+
+        await asyncio.gather(*(run_one(user_id, user_info) for user_id, user_info in following_users.items()))
+        waited = client.rate_limiter.waited_seconds
+
+    return summarize_results(results, time.perf_counter() - started, waited)
+
+
+def update_all_users_async(following_users, concurrency=16, **client_kwargs):
+    return asyncio.run(crawl_users(following_users, concurrency=concurrency, **client_kwargs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl all following users concurrently over HTTP")
+    parser.add_argument('--concurrency', type=int, default=16, help="users crawled at once")
+    parser.add_argument('--rpm', type=int, default=60, help="total requests per minute")
+    parser.add_argument('--per-host', type=int, default=4, help="max in-flight requests per host")
+    parser.add_argument('--base-url', default=api_base, help="API base URL, e.g. a local stub server")
+    args = parser.parse_args()
+
+    if not os.path.exists('data/following.json'):
+        print("No following.json file found. Please add users through the web interface first.")
+    else:
+        with open('data/following.json', 'r', encoding='utf-8') as f:
+            following_users = json.load(f)
+        update_all_users_async(following_users, concurrency=args.concurrency, requests_per_minute=args.rpm,
+                               per_host=args.per_host, base_url=args.base_url)
@@ -0,0 +1,124 @@
+"""Add many users to the following list at once.
+
+Nicknames are resolved over the HTTP card API, `workers` at a time, with
+Chrome (through a small BrowserPool) only for mids the API refuses.
+following.json is written once at the end. Run from the repository root
+with a file of mids or space URLs, one or more per line:
+
+    python -m bili_spider.bulk_import mids.txt --workers 8
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from .fetch import FetchError, HttpBackend
+from .following import edit_following
+from .ratelimit import RateLimiter
+
+MID_RE = re.compile(r'space\.bilibili\.com/(\d+)|(?<![\w/.=&?#-])(\d+)(?![\w.])')
+
+
+def parse_mids(text):
+    """Mids from free text: bare numbers or space.bilibili.com/<mid> links, in order, without repeats"""
+    mids = []
+    for url_mid, bare_mid in MID_RE.findall(text or ''):
+        mid = url_mid or bare_mid
+        if mid not in mids:
+            mids.append(mid)
+    return mids
+
+
+def resolve_nicknames(mids, backend=None, pool=None, workers=8, on_resolved=None):
+    """{mid: nickname} for every mid; `on_resolved(done, total)` is called from the calling thread"""
+    from .spider import get_user_nickname
+
+    def resolve(mid):
+        if backend is not None:
+            try:
+                return backend.get_nickname(mid)
+            except FetchError as e:
+                if pool is None:
+                    print(f"Could not resolve {mid} ({e})")
+                    return f"User_{mid}"
+                print(f"Could not resolve {mid} over HTTP ({e}), trying Chrome")
+        return get_user_nickname(int(mid), pool=pool)
+
+    names = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(resolve, mid): mid for mid in mids}
+        for future in as_completed(futures):
+            mid = futures[future]
+            try:
+                names[mid] = future.result()
+            except Exception as e:
+                print(f"Error resolving {mid}: {e}")
+                names[mid] = f"User_{mid}"
+            if on_resolved:
+                on_resolved(len(names), len(mids))
+    # In input order, so users are added the way they were listed
+    return {mid: names[mid] for mid in mids}
+
+
+def add_users(following_users, names):
+    """Add resolved users to a following dict in place, keeping existing entries; returns the mids added"""
+    added = []
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for mid, name in names.items():
+        if mid in following_users:
+            continue
+        following_users[mid] = {"name": name, "added_at": now, "last_updated": None}
+        added.append(mid)
+    return added
+
+
+def import_users(mids, path='data/following.json', workers=8, requests_per_minute=60, use_chrome=True):
+    """Resolve and add every new mid to following.json, written once; returns the mids added"""
+    following_users = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            following_users = json.load(f)
+
+    new_mids = [mid for mid in mids if mid not in following_users]
+    print(f"Importing {len(new_mids)} new users ({len(mids) - len(new_mids)} already followed)")
+    if not new_mids:
+        return []
+
+    backend = HttpBackend(rate_limiter=RateLimiter(rate_per_minute=requests_per_minute, burst=workers), maxsize=workers)
+    pool = None
+    try:
+        if use_chrome:
+            from .spider import BrowserPool
+            chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
+            pool = BrowserPool(size=min(workers, 2), executable_path=chromedriver_path)
+        names = resolve_nicknames(new_mids, backend=backend, pool=pool, workers=workers,
+                                  on_resolved=lambda done, total: print(f"Resolved {done}/{total}", end='\r'))
+    finally:
+        backend.close()
+        if pool is not None:
+            pool.close()
+
+    # Re-read under the lock so changes made while resolving (e.g. the update worker's last_updated) are kept
+    with edit_following(path) as following_users:
+        added = add_users(following_users, names)
+    print(f"Added {len(added)} users to {path}")
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add many users to the following list")
+    parser.add_argument('source', help="file with mids or space.bilibili.com links, or - for stdin")
+    parser.add_argument('--workers', type=int, default=8, help="nicknames resolved at once")
+    parser.add_argument('--rpm', type=int, default=60, help="nickname requests per minute")
+    parser.add_argument('--no-chrome', action='store_true', help="don't fall back to Chrome for mids the API refuses")
+    args = parser.parse_args()
+
+    if args.source == '-':
+        text = sys.stdin.read()
+    else:
+        with open(args.source, 'r', encoding='utf-8') as f:
+            text = f.read()
+    import_users(parse_mids(text), workers=args.workers, requests_per_minute=args.rpm, use_chrome=not args.no_chrome)
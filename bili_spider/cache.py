@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+
+def file_signature(*paths):
+    """(path, mtime_ns, size) for each path; changes whenever any of the files is written"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def estimate_size(value):
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (dict, list)):
+        return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+    return sys.getsizeof(value)
+
+
+class DataCache:
+    """Memoizes loaded data for the Streamlit app.
+
+    Entries are keyed by name and carry the signature of what they were
+    loaded from, e.g. (path, mtime, size) of a file; a lookup whose signature
+    no longer matches reloads. Total size is kept under `max_bytes` by
+    evicting the least recently used entries.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key, signature, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[1]
+                self._stats['stale'] += 1
+                self._remove(key)
+            self._stats['misses'] += 1
+
+        value = loader()
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (signature, value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._remove(oldest)
+                    self._stats['evictions'] += 1
+        return value
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or those whose key matches `predicate`"""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                self._remove(key)
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+def load_following(cache, path='data/following.json'):
+    def loader():
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    return cache.get(('following', path), file_signature(path), loader)
+
+
+def load_user_frame(cache, store, user_id):
+    # A user's manifest row changes with every write to that user, from this
+    # process or another, so other users' frames stay cached across updates
+    return cache.get(('videos', str(user_id)), (store.path, store.user_version(user_id)),
+                     lambda: store.load_user_frame(user_id))
+
+
+def attach_store(cache, store):
+    """Drop a user's cached frames as soon as this process writes to the store"""
+    store.add_write_listener(lambda user_id: cache.invalidate(lambda key: key == ('videos', str(user_id))))
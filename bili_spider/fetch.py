@@ -0,0 +1,345 @@
+import hashlib
+import json
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+import urllib3
+
+from . import metrics
+from .replay import RecordingDriver, ReplayDriver
+from .spider import BrowserPool, CrawlIncomplete, get_user_videos, get_user_videos_parallel, make_chrome_browser
+from .waits import PacingPolicy
+
+api_base = 'https://api.bilibili.com'
+video_url = 'https://www.bilibili.com/video/{}'
+
+# API codes bilibili answers with when risk control kicks in
+ANTIBOT_CODES = {-352, -412}
+
+# Fixed permutation bilibili applies to img_key + sub_key to build the WBI mixin key
+MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+
+user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36'
+
+
+class FetchError(Exception):
+    """Raised when a backend cannot read the video list (risk control, bad response, ...)"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def get_mixin_key(img_key, sub_key):
+    raw = img_key + sub_key
+    return ''.join(raw[i] for i in MIXIN_KEY_ENC_TAB)[:32]
+
+
+def sign_wbi(params, img_key, sub_key, wts=None):
+    """Return a copy of params with bilibili's WBI `wts` and `w_rid` fields added"""
+    signed = dict(params)
+    signed['wts'] = int(wts if wts is not None else time.time())
+    signed = {
+        k: ''.join(ch for ch in str(v) if ch not in "!'()*")
+        for k, v in sorted(signed.items())
+    }
+    query = urlencode(signed)
+    signed['w_rid'] = hashlib.md5((query + get_mixin_key(img_key, sub_key)).encode()).hexdigest()
+    return signed
+
+
+def format_play_count(play):
+    """Render a play count the way the space page does, e.g. 123456 -> '12.3万'"""
+    if isinstance(play, str):
+        return play
+    if play >= 100000000:
+        return f"{play / 100000000:.1f}亿"
+    if play >= 10000:
+        return f"{play / 10000:.1f}万"
+    return str(play)
+
+
+def video_from_api(item, user_name=None):
+    """Convert one `vlist` entry from the space API into the spider's 7-tuple"""
+    bvid = item['bvid']
+    pub_date = datetime.fromtimestamp(item['created']).strftime("%Y-%m-%d") if item.get('created') else "Unknown"
+    return (
+        video_url.format(bvid),
+        bvid,
+        user_name or item.get('author', ''),
+        item.get('title', 'Unknown'),
+        format_play_count(item.get('play', 0)),
+        pub_date,
+        item.get('length', '00:00'),
+    )
+
+
+class SeleniumBackend:
+    """Reads the video list by driving Chrome through the rendered space page.
+
+    With `parallel_pages` > 1, full crawls (no high-water mark) open pages
+    by URL in that many sessions at once; incremental runs stay sequential.
+    With a replay.ResponseCache as `cache`, every page read is recorded, or
+    in replay mode read back from it without starting Chrome.
+    """
+
+    name = 'selenium'
+
+    def __init__(self, pool=None, executable_path=None, rate_limiter=None, pacing=None, lean=False, parallel_pages=1,
+                 cache=None):
+        self.pool = pool
+        self.cache = cache
+        self.parallel_pages = parallel_pages
+        self.executable_path = executable_path
+        self.lean = lean
+        self.rate_limiter = rate_limiter
+        self.pacing = pacing
+        if cache is not None and cache.mode == 'replay':
+            # Nothing goes over the network, so nothing to be polite about
+            self.rate_limiter = None
+            self.pacing = PacingPolicy.none()
+
+    @contextmanager
+    def _session(self):
+        if self.cache is not None and self.cache.mode == 'replay':
+            yield ReplayDriver(self.cache)
+        elif self.pool is not None:
+            with self.pool.lease() as browser:
+                yield self._recording(browser)
+        else:
+            with make_chrome_browser(executable_path=self.executable_path, headless=True, lean=self.lean) as browser:
+                yield self._recording(browser)
+
+    def _recording(self, browser):
+        return RecordingDriver(browser, self.cache) if self.cache is not None else browser
+
+    def iter_videos(self, mid, max_pages=None, progress_callback=None, high_water_mark=None, start_page=1):
+        # Parallel sessions lease straight from the pool, so recording and replay stay sequential
+        if self.parallel_pages > 1 and high_water_mark is None and self.cache is None and start_page == 1:
+            pool = self.pool or BrowserPool(size=self.parallel_pages, executable_path=self.executable_path, lean=self.lean)
+            try:
+                yield from get_user_videos_parallel(pool, int(mid), sessions=self.parallel_pages, max_pages=max_pages,
+                                                    progress_callback=progress_callback,
+                                                    rate_limiter=self.rate_limiter, pacing=self.pacing)
+            finally:
+                if self.pool is None:
+                    pool.close()
+            return
+
+        with self._session() as browser:
+            yield from get_user_videos(browser, int(mid), max_pages=max_pages,
+                                       progress_callback=progress_callback,
+                                       rate_limiter=self.rate_limiter, pacing=self.pacing,
+                                       high_water_mark=high_water_mark, start_page=start_page)
+
+    def close(self):
+        pass
+
+
+class HttpBackend:
+    """Reads the video list from the space JSON API over a pooled keep-alive client.
+
+    Handles WBI request signing and keeps the cookies bilibili hands out
+    (buvid3/buvid4, plus any SESSDATA passed in) across requests. `base_url`
+    can point at a local stub server (see bili_spider.stub_server). With a
+    replay.ResponseCache as `cache`, list pages and nickname lookups are
+    recorded, or in replay mode only ever read from it. Requests made to
+    find out what's new (probes, incremental crawls) always go to the
+    network when recording.
+    """
+
+    name = 'http'
+
+    def __init__(self, base_url=api_base, cookies=None, rate_limiter=None, page_size=30,
+                 timeout=10, maxsize=4, pacing=None, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.cookies = dict(cookies or {})
+        self.rate_limiter = rate_limiter
+        # Without a shared rate limiter, pace pages like the browser would
+        self.pacing = pacing or (PacingPolicy.none() if rate_limiter else PacingPolicy(between_pages=0.5, jitter=1.0))
+        if cache is not None and cache.mode == 'replay':
+            self.pacing = PacingPolicy.none()
+        self.page_size = page_size
+        self.http = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=maxsize,
+            timeout=urllib3.Timeout(total=timeout),
+            retries=urllib3.Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504]),
+            headers={
+                'User-Agent': user_agent,
+                'Referer': 'https://space.bilibili.com/',
+                'Origin': 'https://space.bilibili.com',
+            },
+        )
+        self._wbi_keys = None
+        self._wbi_keys_at = 0
+
+    def _request_json(self, path, params=None):
+        url = self.base_url + path
+        if params:
+            url += '?' + urlencode(params)
+        if self.rate_limiter:
+            self.rate_limiter.acquire_url(url)
+
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        try:
+            with metrics.span('api_request'):
+                resp = self.http.request('GET', url, headers=headers)
+        except urllib3.exceptions.HTTPError as e:
+            raise FetchError(f"Request to {path} failed: {e}")
+
+        for header in resp.headers.getlist('Set-Cookie'):
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for key, morsel in cookie.items():
+                self.cookies[key] = morsel.value
+
+        if resp.status != 200:
+            raise FetchError(f"HTTP {resp.status} from {path}", code=resp.status)
+        try:
+            payload = json.loads(resp.data.decode('utf-8'))
+        except ValueError:
+            raise FetchError(f"Invalid JSON from {path}")
+        return payload
+
+    def _ensure_cookies(self):
+        if 'buvid3' in self.cookies:
+            return
+        try:
+            payload = self._request_json('/x/frontend/finger/spi')
+            data = payload.get('data') or {}
+            if data.get('b_3'):
+                self.cookies['buvid3'] = data['b_3']
+            if data.get('b_4'):
+                self.cookies['buvid4'] = data['b_4']
+        except FetchError as e:
+            print(f"Could not get buvid cookies: {e}")
+
+    def _get_wbi_keys(self):
+        # The keys rotate daily; refreshing hourly is plenty
+        if self._wbi_keys and time.time() - self._wbi_keys_at < 3600:
+            return self._wbi_keys
+        payload = self._request_json('/x/web-interface/nav')
+        wbi_img = (payload.get('data') or {}).get('wbi_img') or {}
+        try:
+            img_key = wbi_img['img_url'].rsplit('/', 1)[1].split('.')[0]
+            sub_key = wbi_img['sub_url'].rsplit('/', 1)[1].split('.')[0]
+        except (KeyError, IndexError):
+            raise FetchError("Could not read WBI keys from nav response")
+        self._wbi_keys = (img_key, sub_key)
+        self._wbi_keys_at = time.time()
+        return self._wbi_keys
+
+    def _cached(self, key, fresh=False):
+        if self.cache is None or (fresh and self.cache.mode == 'record'):
+            return None
+        value = self.cache.get_json(key)
+        if value is None and self.cache.mode == 'replay':
+            raise FetchError(f"{key} is not in the replay cache", code='replay_miss')
+        return value
+
+    def fetch_page(self, mid, pn=1, page_size=None, fresh=False):
+        """Fetch one page of the space video list and return the API `data` object.
+
+        With `fresh`, a recording cache only stores the response and never
+        answers from what it holds.
+        """
+        key = f'api/arc_search/{mid}/{pn}/{page_size or self.page_size}'
+        cached = self._cached(key, fresh)
+        if cached is not None:
+            return cached
+        self._ensure_cookies()
+        img_key, sub_key = self._get_wbi_keys()
+        params = sign_wbi({
+            'mid': int(mid),
+            'ps': page_size or self.page_size,
+            'pn': pn,
+            'order': 'pubdate',
+            'tid': 0,
+            'keyword': '',
+            'platform': 'web',
+        }, img_key, sub_key)
+        payload = self._request_json('/x/space/wbi/arc/search', params)
+        if payload.get('code') in ANTIBOT_CODES:
+            metrics.count('antibot_blocks')
+        if payload.get('code') != 0:
+            raise FetchError(f"API error {payload.get('code')}: {payload.get('message')}", code=payload.get('code'))
+        data = payload.get('data') or {}
+        if self.cache is not None:
+            self.cache.put_json(key, data)
+        return data
+
+    def iter_videos(self, mid, max_pages=None, progress_callback=None, high_water_mark=None, start_page=1):
+        # An incremental crawl is looking for what's new, which a recorded page can't show
+        fresh = high_water_mark is not None
+        data = self.fetch_page(mid, start_page, fresh=fresh)
+        count = (data.get('page') or {}).get('count', 0)
+        total_pages = max(1, math.ceil(count / self.page_size))
+        if max_pages:
+            total_pages = min(total_pages, max_pages)
+        print(f"Found {total_pages} pages ({count} videos) for user {mid}")
+
+        processed_bvids = set()
+        current_page = start_page
+        while current_page <= total_pages:
+            vlist = (data.get('list') or {}).get('vlist') or []
+            if not vlist and count:
+                # The count says there's more; an empty page here means we were cut off
+                raise CrawlIncomplete(mid, current_page - 1, total_pages)
+            if progress_callback:
+                progress_callback(current_page, total_pages, f"正在读取第 {current_page}/{total_pages} 页")
+            metrics.count('pages')
+            metrics.count('cards', len(vlist))
+            for item in vlist:
+                video = video_from_api(item)
+                if high_water_mark is not None and high_water_mark.reached(video):
+                    print(f"Reached stored videos at {video[1]} on page {current_page}")
+                    return
+                if video[1] not in processed_bvids:
+                    processed_bvids.add(video[1])
+                    yield video
+
+            if current_page >= total_pages:
+                break
+            current_page += 1
+            self.pacing.pace()
+            data = self.fetch_page(mid, current_page, fresh=fresh)
+
+    def get_nickname(self, mid):
+        key = f'api/card/{mid}'
+        card = self._cached(key)
+        if card is None:
+            payload = self._request_json('/x/web-interface/card', {'mid': int(mid)})
+            if payload.get('code') != 0:
+                raise FetchError(f"API error {payload.get('code')}: {payload.get('message')}", code=payload.get('code'))
+            card = (payload.get('data') or {}).get('card') or {}
+            if self.cache is not None:
+                self.cache.put_json(key, card)
+        return card.get('name') or f"User_{mid}"
+
+    def close(self):
+        self.http.clear()
+
+
+BACKENDS = {
+    'selenium': SeleniumBackend,
+    'http': HttpBackend,
+}
+
+
+def make_backend(name='selenium', **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown fetch backend: {name}")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,71 @@
+"""Reading and writing data/following.json from several processes at once.
+
+The app, the update worker, the scheduler and the CLI tools all rewrite
+following.json while the app keeps re-reading it. Writes go to a temp file
+that is renamed into place, so a reader never sees a half-written file.
+Read-modify-write cycles hold an exclusive lock on following.json.lock
+(flock; without fcntl, e.g. on Windows, only threads of one process are
+kept apart) so two writers can't undo each other's edits.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FOLLOWING_PATH = 'data/following.json'
+
+# flock doesn't keep threads of one process apart, so they queue here first
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def following_lock(path=FOLLOWING_PATH):
+    """Hold the cross-process lock for `path`; not re-entrant"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with _thread_lock:
+        with open(path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+def read_following(path=FOLLOWING_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_following(following, path=FOLLOWING_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(following, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def edit_following(path=FOLLOWING_PATH):
+    """Yield following.json as a dict under the lock and write it back afterwards"""
+    with following_lock(path):
+        following = read_following(path)
+        yield following
+        write_following(following, path)
+
+
+def save_last_updated(following_users, path=FOLLOWING_PATH):
+    """Merge the last_updated stamps of `following_users` into following.json, keeping other edits on disk.
+
+    The newer stamp wins, so a copy loaded before another process updated
+    a user can't turn its stamp back.
+    """
+    with edit_following(path) as following:
+        for user_id, user_info in following_users.items():
+            stamp = user_info.get('last_updated')
+            if user_id in following and stamp and stamp > (following[user_id].get('last_updated') or ''):
+                following[user_id]['last_updated'] = stamp
@@ -0,0 +1,271 @@
+"""Update jobs queued by the app and run by a separate worker process.
+
+The app only enqueues jobs and reads their status, so a long crawl never
+blocks a Streamlit session and survives a page refresh. The worker claims
+jobs from data/jobs.db, runs update_user_videos for each, and writes the
+progress_callback updates back to the job row. It heartbeats while alive;
+jobs left 'running' by a worker that died are queued again when the next
+one starts. Run it by hand from the repository root, or let the app start
+it:
+
+    python -m bili_spider.jobs worker --workers 2
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+JOBS_DB = 'data/jobs.db'
+WORKER_LOG = 'data/worker.log'
+HEARTBEAT_SECONDS = 5
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    user_name TEXT,
+    status TEXT NOT NULL,
+    current_page INTEGER NOT NULL DEFAULT 0,
+    total_pages INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    new_count INTEGER,
+    error TEXT,
+    worker_pid INTEGER,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+'''
+
+JOB_COLUMNS = ['id', 'user_id', 'user_name', 'status', 'current_page', 'total_pages', 'message', 'new_count',
+               'error', 'worker_pid', 'created_at', 'started_at', 'finished_at']
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class JobQueue:
+    """SQLite-backed queue of per-user update jobs: queued -> running -> done/failed"""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None so claim() can take the write lock up front
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _rows(self, sql, params=()):
+        return [dict(zip(JOB_COLUMNS, row)) for row in self._conn().execute(sql, params)]
+
+    def enqueue(self, user_id, user_name):
+        """Queue an update for a user; returns the id of the job already queued or running for them, if any"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("SELECT id FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                               (str(user_id),)).fetchone()
+            if row is None:
+                cursor = conn.execute("INSERT INTO jobs (user_id, user_name, status, created_at) VALUES (?, ?, 'queued', ?)",
+                                      (str(user_id), user_name, _now()))
+                job_id = cursor.lastrowid
+            else:
+                job_id = row[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return job_id
+
+    def claim(self, worker_pid):
+        """Mark the oldest queued job as running for this worker and return it, or None"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ? WHERE id = ?",
+                             (worker_pid, _now(), row[0]))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return dict(zip(JOB_COLUMNS, row)) if row is not None else None
+
+    def progress(self, job_id, current_page, total_pages, message):
+        self._conn().execute('UPDATE jobs SET current_page = ?, total_pages = ?, message = ? WHERE id = ?',
+                             (current_page, total_pages, message, job_id))
+
+    def finish(self, job_id, new_count=None, error=None):
+        self._conn().execute('UPDATE jobs SET status = ?, new_count = ?, error = ?, finished_at = ? WHERE id = ?',
+                             ('failed' if error else 'done', new_count, error, _now(), job_id))
+
+    def jobs(self, limit=20):
+        """Active jobs in queue order, then the most recently finished ones"""
+        active = self._rows(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN ('queued', 'running') ORDER BY id")
+        finished = self._rows(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status NOT IN ('queued', 'running') "
+                              "ORDER BY id DESC LIMIT ?", (limit,))
+        return active + finished
+
+    def active_count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def clear_finished(self):
+        self._conn().execute("DELETE FROM jobs WHERE status NOT IN ('queued', 'running')")
+
+    def heartbeat(self, pid):
+        self._conn().execute('INSERT OR REPLACE INTO workers (pid, heartbeat) VALUES (?, ?)', (pid, time.time()))
+
+    def remove_worker(self, pid):
+        self._conn().execute('DELETE FROM workers WHERE pid = ?', (pid,))
+
+    def live_workers(self, max_age=3 * HEARTBEAT_SECONDS):
+        rows = self._conn().execute('SELECT pid FROM workers WHERE heartbeat > ?', (time.time() - max_age,))
+        return [row[0] for row in rows]
+
+    def requeue_orphans(self, max_age=3 * HEARTBEAT_SECONDS):
+        """Put jobs whose worker stopped heartbeating back in the queue"""
+        cursor = self._conn().execute('''
+            UPDATE jobs SET status = 'queued', worker_pid = NULL, started_at = NULL
+            WHERE status = 'running'
+              AND (worker_pid IS NULL OR worker_pid NOT IN (SELECT pid FROM workers WHERE heartbeat > ?))
+        ''', (time.time() - max_age,))
+        if cursor.rowcount:
+            print(f"Requeued {cursor.rowcount} jobs left running by a stopped worker")
+        return cursor.rowcount
+
+
+def run_job(queue, job, pool, rate_limiter, backend, chromedriver_path):
+    from .updater import mark_user_updated, update_user_videos
+
+    def progress_callback(current_page, total_pages, message):
+        queue.progress(job['id'], current_page, total_pages, message)
+
+    print(f"Job {job['id']}: updating {job['user_name']} (ID: {job['user_id']})")
+    try:
+        new_count = update_user_videos(job['user_id'], job['user_name'], chromedriver_path,
+                                       progress_callback=progress_callback, pool=pool,
+                                       rate_limiter=rate_limiter, backend=backend)
+    except Exception as e:
+        print(f"Job {job['id']} failed: {e}")
+        queue.finish(job['id'], error=str(e))
+        return
+    mark_user_updated(job['user_id'])
+    queue.finish(job['id'], new_count=new_count)
+
+
+def run_worker(workers=1, backend='selenium', requests_per_minute=20, idle_exit=None, poll_seconds=1.0, path=JOBS_DB,
+               lean=False, tabs=False):
+    """Claim and run jobs `workers` at a time until stopped, or until idle for `idle_exit` seconds"""
+    from .fetch import HttpBackend
+    from .ratelimit import RateLimiter
+    from .spider import BrowserPool, TabbedBrowser
+
+    queue = JobQueue(path)
+    pid = os.getpid()
+    queue.heartbeat(pid)
+    queue.requeue_orphans()
+
+    chromedriver_path = "./chromedriver" if os.path.exists("./chromedriver") else None
+    rate_limiter = RateLimiter(rate_per_minute=requests_per_minute)
+    http_backend = HttpBackend(rate_limiter=rate_limiter, maxsize=workers) if backend == 'http' else None
+    stop = threading.Event()
+    last_activity = [time.time()]
+
+    def heartbeat_loop():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            queue.heartbeat(pid)
+
+    def work_loop(pool):
+        while not stop.is_set():
+            job = queue.claim(pid)
+            if job is None:
+                if idle_exit is not None and time.time() - last_activity[0] > idle_exit:
+                    stop.set()
+                    break
+                time.sleep(poll_seconds)
+                continue
+            run_job(queue, job, pool, rate_limiter, http_backend, chromedriver_path)
+            last_activity[0] = time.time()
+
+    print(f"Worker {pid} started with {workers} workers")
+    threading.Thread(target=heartbeat_loop, daemon=True).start()
+    try:
+        pool_class = TabbedBrowser if tabs else BrowserPool
+        with pool_class(workers, executable_path=chromedriver_path, lean=lean) as pool:
+            threads = [threading.Thread(target=work_loop, args=(pool,)) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    except KeyboardInterrupt:
+        print("Worker stopping")
+    finally:
+        stop.set()
+        queue.remove_worker(pid)
+        if http_backend:
+            http_backend.close()
+    print(f"Worker {pid} stopped")
+
+
+def ensure_worker(queue, workers=1, backend='selenium', idle_exit=300, lean=False, tabs=False):
+    """Start a detached worker process unless one is already heartbeating; returns True if one was started"""
+    if queue.live_workers():
+        return False
+    os.makedirs(os.path.dirname(WORKER_LOG), exist_ok=True)
+    with open(WORKER_LOG, 'a', encoding='utf-8') as log:
+        # A session of its own, so the worker outlives the Streamlit script run that started it
+        subprocess.Popen([sys.executable, '-u', '-m', 'bili_spider.jobs', 'worker', '--workers', str(workers),
+                          '--backend', backend, '--idle-exit', str(idle_exit), '--db', queue.path]
+                         + (['--lean'] if lean else []) + (['--tabs'] if tabs else []),
+                         stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    # Count it as live right away so a second click doesn't start another
+    queue.heartbeat(-1)
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run queued update jobs")
+    sub = parser.add_subparsers(dest='command', required=True)
+    worker_parser = sub.add_parser('worker', help="claim and run queued jobs")
+    worker_parser.add_argument('--workers', type=int, default=1, help="jobs run at once, each with its own browser")
+    worker_parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium')
+    worker_parser.add_argument('--rpm', type=int, default=20, help="total page requests per minute")
+    worker_parser.add_argument('--idle-exit', type=float, default=None, help="exit after this many seconds without jobs")
+    worker_parser.add_argument('--lean', action='store_true', help="don't load images, fonts, media or trackers in Chrome")
+    worker_parser.add_argument('--tabs', action='store_true', help="run the workers as tabs of one Chrome instead of one Chrome each")
+    worker_parser.add_argument('--db', default=JOBS_DB)
+    enqueue_parser = sub.add_parser('enqueue', help="queue an update for every user in data/following.json")
+    enqueue_parser.add_argument('--db', default=JOBS_DB)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        run_worker(workers=args.workers, backend=args.backend, requests_per_minute=args.rpm,
+                   idle_exit=args.idle_exit, path=args.db, lean=args.lean, tabs=args.tabs)
+    elif args.command == 'enqueue':
+        with open('data/following.json', 'r', encoding='utf-8') as f:
+            following_users = json.load(f)
+        queue = JobQueue(args.db)
+        for user_id, user_info in following_users.items():
+            queue.enqueue(user_id, user_info['name'])
+        print(f"Queued {len(following_users)} update jobs")
@@ -0,0 +1,167 @@
+"""Phase timings, counters and wait histograms for crawl runs.
+
+Off by default: span() then hands back one shared no-op context manager
+and count()/observe() return straight away, so the hooks left in the
+spider cost next to nothing. enable() starts collecting for the whole
+process. A run can then be appended to data/metrics.jsonl as one JSON
+line, and written as Prometheus text to data/metrics.prom for
+node_exporter's textfile collector.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+METRICS_JSONL = 'data/metrics.jsonl'
+METRICS_PROM = 'data/metrics.prom'
+PREFIX = 'bili_spider'
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+# What each histogram's label means, for the Prometheus output
+HISTOGRAM_LABELS = {
+    'phase_seconds': 'phase',
+    'wait_seconds': 'wait',
+}
+
+_NULL_SPAN = nullcontext()
+_metrics = None
+
+
+class Metrics:
+    """Counters plus per-label histograms of seconds, safe to update from any thread"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self.counters = {}
+        # (histogram, label) -> [count per bucket..., count over the last bucket, sum, max]
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, histogram, label, seconds):
+        with self._lock:
+            values = self.histograms.get((histogram, label))
+            if values is None:
+                values = self.histograms[(histogram, label)] = [0] * (len(self.buckets) + 1) + [0.0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+                    break
+            else:
+                values[len(self.buckets)] += 1
+            values[-2] += seconds
+            values[-1] = max(values[-1], seconds)
+
+    @contextmanager
+    def span(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('phase_seconds', phase, time.perf_counter() - started)
+
+    def snapshot(self):
+        """Counters and histogram summaries as plain dicts"""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: list(values) for key, values in self.histograms.items()}
+        summary = {}
+        for (histogram, label), values in sorted(histograms.items()):
+            count = sum(values[:-2])
+            summary.setdefault(histogram, {})[label] = {
+                'count': count,
+                'total': round(values[-2], 3),
+                'mean': round(values[-2] / count, 3) if count else 0.0,
+                'max': round(values[-1], 3),
+                'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], values[:-2])),
+            }
+        return {'counters': counters, **summary}
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: list(values) for key, values in self.histograms.items()}
+        for name, value in sorted(counters.items()):
+            lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+            lines.append(f'{PREFIX}_{name}_total {value}')
+        typed = set()
+        for (histogram, label), values in sorted(histograms.items()):
+            metric = f'{PREFIX}_{histogram}'
+            if histogram not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(histogram)
+            label_text = f'{HISTOGRAM_LABELS.get(histogram, "label")}="{label}"'
+            cumulative = 0
+            for bound, n in zip([str(b) for b in self.buckets] + ['+Inf'], values[:-2]):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{label_text}}} {values[-2]:.6f}')
+            lines.append(f'{metric}_count{{{label_text}}} {cumulative}')
+        lines.append(f'# TYPE {PREFIX}_run_started_seconds gauge')
+        lines.append(f'{PREFIX}_run_started_seconds {self.started_at:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def write_jsonl(self, path=METRICS_JSONL, **extra):
+        """Append this run as one JSON line; `extra` (e.g. the run summary) is stored alongside"""
+        record = {
+            'started_at': datetime.fromtimestamp(self.started_at).strftime("%Y-%m-%d %H:%M:%S"),
+            'seconds': round(time.time() - self.started_at, 3),
+            **extra,
+            **self.snapshot(),
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def write_prometheus(self, path=METRICS_PROM):
+        # Renamed into place so a scrape never reads a half-written file
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def enable(buckets=BUCKETS):
+    """Start collecting for this process; returns the Metrics that the hooks now feed"""
+    global _metrics
+    _metrics = Metrics(buckets)
+    return _metrics
+
+
+def disable():
+    """Stop collecting; returns what was collected, if anything"""
+    global _metrics
+    metrics, _metrics = _metrics, None
+    return metrics
+
+
+def current():
+    return _metrics
+
+
+def span(phase):
+    """Time a block as `phase`; a shared no-op context manager while disabled"""
+    metrics = _metrics
+    if metrics is None:
+        return _NULL_SPAN
+    return metrics.span(phase)
+
+
+def count(name, n=1):
+    metrics = _metrics
+    if metrics is not None:
+        metrics.count(name, n)
+
+
+def observe(histogram, label, seconds):
+    metrics = _metrics
+    if metrics is not None:
+        metrics.observe(histogram, label, seconds)
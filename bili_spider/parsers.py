@@ -0,0 +1,225 @@
+"""Video-card parsers for the space page HTML.
+
+Every backend returns exactly the tuples the original BeautifulSoup code did:
+cards are looked up as div.bili-video-card, then div.small-item, then
+div.video-item, then any div whose class mentions "video". The fast backends
+classify every div in one walk of the tree instead of up to four find_all
+passes.
+"""
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+CARD_CLASSES = ('bili-video-card', 'small-item', 'video-item')
+
+
+def _video_tuple(href, link_text, title_text, spans, subtitle_text, user_name):
+    url = href
+    if not url.startswith('http'):
+        url = 'https:' + url
+
+    url = url.split('?')[0]
+    bvid = url.strip("/").split("/")[-1]
+
+    title = "Unknown"
+    if title_text is not None:
+        title = title_text.strip()
+    elif link_text:
+        title = link_text.strip()
+
+    play_count = "0"
+    duration = "00:00"
+    if spans is not None:
+        if len(spans) >= 1:
+            play_count = spans[0].strip()
+        for span in spans:
+            if ':' in span:
+                duration = span.strip()
+                break
+
+    pub_date = "Unknown"
+    if subtitle_text is not None:
+        pub_date = subtitle_text.strip()
+
+    return (url, bvid, user_name, title, play_count, pub_date, duration)
+
+
+def parse_html_bs4(page_source, user_name):
+    """Reference parser: BeautifulSoup with the pure-Python html.parser"""
+    videos = []
+    html = BeautifulSoup(page_source, "html.parser")
+
+    # Try multiple selectors for video cards
+    video_cards = []
+
+    # First try the new format
+    video_cards = html.find_all('div', class_='bili-video-card')
+
+    # If no cards found, try alternative selectors
+    if not video_cards:
+        video_cards = html.find_all('div', class_='small-item')
+
+    if not video_cards:
+        video_cards = html.find_all('div', class_='video-item')
+
+    if not video_cards:
+        # Try finding any div with video in the class name
+        video_cards = html.find_all('div', class_=lambda x: x and 'video' in x.lower())
+
+    for card in video_cards:
+        try:
+            link_elem = card.find('a')
+            if not link_elem or not link_elem.get('href'):
+                continue
+
+            title_text = None
+            title_elem = card.find('div', class_='bili-video-card__title')
+            if title_elem and title_elem.find('a'):
+                title_text = title_elem.find('a').text
+
+            spans = None
+            cover_elem = card.find('div', class_='bili-video-card__cover')
+            if cover_elem:
+                spans = [span.text for span in cover_elem.find_all('span')]
+
+            subtitle_elem = card.find('div', class_='bili-video-card__subtitle')
+            subtitle_text = subtitle_elem.text if subtitle_elem else None
+
+            videos.append(_video_tuple(link_elem['href'], link_elem.text, title_text, spans, subtitle_text, user_name))
+
+        except Exception as e:
+            print(f"Error parsing video card: {e}")
+            continue
+
+    return videos
+
+
+def _pick_cards(buckets):
+    for cards in buckets:
+        if cards:
+            return cards
+    return []
+
+
+def parse_html_lxml(page_source, user_name):
+    """libxml2-backed parser; finds the card container in a single pass over the divs"""
+    videos = []
+    root = lxml.html.fromstring(page_source)
+
+    buckets = ([], [], [], [])
+    for div in root.iter('div'):
+        cls = div.get('class')
+        if cls is None:
+            continue
+        tokens = cls.split()
+        for i, name in enumerate(CARD_CLASSES):
+            if name in tokens:
+                buckets[i].append(div)
+        if 'video' in cls.lower():
+            buckets[3].append(div)
+
+    for card in _pick_cards(buckets):
+        try:
+            link_elem = next(card.iterdescendants('a'), None)
+            if link_elem is None or not link_elem.get('href'):
+                continue
+
+            title_elem = cover_elem = subtitle_elem = None
+            for div in card.iterdescendants('div'):
+                tokens = (div.get('class') or '').split()
+                if title_elem is None and 'bili-video-card__title' in tokens:
+                    title_elem = div
+                if cover_elem is None and 'bili-video-card__cover' in tokens:
+                    cover_elem = div
+                if subtitle_elem is None and 'bili-video-card__subtitle' in tokens:
+                    subtitle_elem = div
+
+            title_text = None
+            if title_elem is not None:
+                title_link = next(title_elem.iterdescendants('a'), None)
+                if title_link is not None:
+                    title_text = title_link.text_content()
+
+            spans = None
+            if cover_elem is not None:
+                spans = [span.text_content() for span in cover_elem.iterdescendants('span')]
+            subtitle_text = subtitle_elem.text_content() if subtitle_elem is not None else None
+
+            videos.append(_video_tuple(link_elem.get('href'), link_elem.text_content(),
+                                       title_text, spans, subtitle_text, user_name))
+
+        except Exception as e:
+            print(f"Error parsing video card: {e}")
+            continue
+
+    return videos
+
+
+def parse_html_selectolax(page_source, user_name):
+    """lexbor-backed parser via selectolax; single CSS pass for the card container"""
+    videos = []
+    tree = SelectolaxParser(page_source)
+
+    buckets = ([], [], [], [])
+    for div in tree.css('div[class]'):
+        cls = div.attributes.get('class') or ''
+        tokens = cls.split()
+        for i, name in enumerate(CARD_CLASSES):
+            if name in tokens:
+                buckets[i].append(div)
+        if 'video' in cls.lower():
+            buckets[3].append(div)
+
+    for card in _pick_cards(buckets):
+        try:
+            link_elem = card.css_first('a')
+            if link_elem is None or not link_elem.attributes.get('href'):
+                continue
+
+            title_text = None
+            title_elem = card.css_first('div.bili-video-card__title')
+            if title_elem is not None:
+                title_link = title_elem.css_first('a')
+                if title_link is not None:
+                    title_text = title_link.text(deep=True)
+
+            spans = None
+            cover_elem = card.css_first('div.bili-video-card__cover')
+            if cover_elem is not None:
+                spans = [span.text(deep=True) for span in cover_elem.css('span')]
+
+            subtitle_elem = card.css_first('div.bili-video-card__subtitle')
+            subtitle_text = subtitle_elem.text(deep=True) if subtitle_elem is not None else None
+
+            videos.append(_video_tuple(link_elem.attributes['href'], link_elem.text(deep=True),
+                                       title_text, spans, subtitle_text, user_name))
+
+        except Exception as e:
+            print(f"Error parsing video card: {e}")
+            continue
+
+    return videos
+
+
+PARSERS = {'bs4': parse_html_bs4}
+if lxml is not None:
+    PARSERS['lxml'] = parse_html_lxml
+if SelectolaxParser is not None:
+    PARSERS['selectolax'] = parse_html_selectolax
+
+DEFAULT_PARSER = next(name for name in ('selectolax', 'lxml', 'bs4') if name in PARSERS)
+
+
+def parse_html(page_source, user_name, parser=None):
+    name = parser or DEFAULT_PARSER
+    if name not in PARSERS:
+        raise ValueError(f"Unknown or unavailable parser backend: {name} (available: {', '.join(PARSERS)})")
+    return PARSERS[name](page_source, user_name)
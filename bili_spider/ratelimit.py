@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+DEFAULT_HOST = 'space.bilibili.com'
+
+
+class RateLimiter:
+    """Token bucket shared by every worker, one bucket per host.
+
+    `rate_per_minute` is the sustained request budget for a host and `burst`
+    how many requests may go out back to back after an idle period.
+    """
+
+    def __init__(self, rate_per_minute=20, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+        self.requests = 0
+
+    def _reserve(self, host):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            tokens -= 1
+            self._buckets[host] = (tokens, now)
+            self.requests += 1
+            if tokens >= 0:
+                return 0.0
+            wait = -tokens / self.rate
+            self.waited_seconds += wait
+            return wait
+
+    def acquire(self, host=DEFAULT_HOST):
+        """Block until a request to `host` fits in the budget"""
+        wait = self._reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def acquire_url(self, url):
+        return self.acquire(urlparse(url).netloc or DEFAULT_HOST)
+
+
+class AsyncRateLimiter(RateLimiter):
+    """RateLimiter for coroutines; waits with asyncio.sleep instead of blocking"""
+
+    async def acquire(self, host=DEFAULT_HOST):
+        wait = self._reserve(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    async def acquire_url(self, url):
+        return await self.acquire(urlparse(url).netloc or DEFAULT_HOST)
@@ -0,0 +1,472 @@
+"""Record/replay cache for crawl responses, for parser work and cheap reruns.
+
+In record mode, every space page the spider parses is stored as a
+snapshot (URL, title, HTML), along with the nickname pages and the JSON
+API responses HttpBackend reads. Chrome always loads pages live; only
+HttpBackend answers from the cache while an entry is younger than the TTL,
+and never for probes or incremental crawls, which must see what's new.
+In replay mode nothing goes to the network: ReplayDriver stands in for
+Chrome and answers from the snapshots, and a page that was never recorded
+fails fast with ReplayMiss.
+
+Blobs are gzip-compressed and stored under their SHA-256, so unchanged
+pages are kept once. The index of keys lives in SQLite, and the total size
+is kept under `max_bytes` by dropping the least recently used keys. After
+a parser change, reparse the whole recorded history into the store with:
+
+    python -m bili_spider.replay reparse
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException
+
+from .waits import CARD_SELECTOR, PAGE_SIGNATURE_JS, PAGE_STATE_JS
+
+CACHE_DIR = 'data/replay'
+MODES = ('record', 'replay')
+DAY = 24 * 3600
+
+SPACE_URL_RE = re.compile(r'space\.bilibili\.com/(\d+)(/video)?')
+BVID_RE = re.compile(r'BV[0-9A-Za-z]{10}')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_used ON entries(used_at);
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+'''
+
+
+class ReplayMiss(Exception):
+    """Raised in replay mode for a page that was never recorded"""
+
+
+class ResponseCache:
+    """Content-addressed, gzip-compressed blob store with a key index, TTL and LRU size bound.
+
+    `mode` is 'record' (serve entries younger than `ttl`, store the rest)
+    or 'replay' (serve whatever is stored, however old; callers treat a
+    miss as an error).
+    """
+
+    def __init__(self, path=CACHE_DIR, mode='record', ttl=DAY, max_bytes=512 * 1024 * 1024):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'stored': 0, 'evicted': 0}
+        os.makedirs(os.path.join(self.path, 'objects'), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, 'index.db'), timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest + '.gz')
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        """The bytes stored under `key`, or None if missing (or, when recording, older than the TTL)"""
+        conn = self._conn()
+        row = conn.execute('SELECT digest, stored_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        digest, stored_at = row
+        if self.mode == 'record' and self.ttl and time.time() - stored_at > self.ttl:
+            self._count('stale')
+            return None
+        try:
+            with gzip.open(self._object_path(digest), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with conn:
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._count('misses')
+            return None
+        with conn:
+            conn.execute('UPDATE entries SET used_at = ? WHERE key = ?', (time.time(), key))
+        self._count('hits')
+        return data
+
+    def put(self, key, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temp name so a reader never sees half a blob
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO objects (digest, size) VALUES (?, ?)', (digest, os.path.getsize(path)))
+            conn.execute('INSERT OR REPLACE INTO entries (key, digest, stored_at, used_at) VALUES (?, ?, ?, ?)',
+                         (key, digest, now, now))
+        self._count('stored')
+        if self.max_bytes:
+            self.evict()
+
+    def stored_at(self, key):
+        """When `key` was last stored, as a Unix time, or None"""
+        row = self._conn().execute('SELECT stored_at FROM entries WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_json(self, key):
+        data = self.get(key)
+        return json.loads(data.decode('utf-8')) if data is not None else None
+
+    def put_json(self, key, value):
+        self.put(key, json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+    def keys(self, prefix=''):
+        rows = self._conn().execute('SELECT key FROM entries WHERE key LIKE ? ORDER BY key', (prefix + '%',))
+        return [row[0] for row in rows]
+
+    def size(self):
+        return self._conn().execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used keys until the blobs fit in max_bytes; returns the keys dropped"""
+        conn = self._conn()
+        dropped = 0
+        excess = self.size() - self.max_bytes
+        while excess > 0:
+            keys = []
+            freed = 0
+            for key, size in conn.execute('SELECT e.key, o.size FROM entries e JOIN objects o ON o.digest = e.digest '
+                                          'ORDER BY e.used_at'):
+                keys.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            if not keys:
+                break
+            with conn:
+                conn.executemany('DELETE FROM entries WHERE key = ?', keys)
+            dropped += len(keys)
+            self._delete_orphans()
+            # Blobs shared with keys still present weren't freed, so look again
+            excess = self.size() - self.max_bytes
+        if dropped:
+            with self._lock:
+                self._stats['evicted'] += dropped
+        return dropped
+
+    def prune(self):
+        """Drop keys older than the TTL and the blobs nothing refers to any more; returns the keys dropped"""
+        conn = self._conn()
+        with conn:
+            dropped = conn.execute('DELETE FROM entries WHERE stored_at < ?', (time.time() - self.ttl,)).rowcount
+        self._delete_orphans()
+        return dropped
+
+    def _delete_orphans(self):
+        conn = self._conn()
+        orphans = [row[0] for row in conn.execute(
+            'SELECT digest FROM objects WHERE digest NOT IN (SELECT digest FROM entries)')]
+        for digest in orphans:
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+        with conn:
+            conn.executemany('DELETE FROM objects WHERE digest = ?', [(digest,) for digest in orphans])
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        conn = self._conn()
+        stats['keys'] = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        stats['objects'] = conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+        stats['bytes'] = self.size()
+        return stats
+
+
+def snapshot_key(url, pn=None):
+    """'page/<mid>/<pn>' for a space video list page, 'profile/<mid>' for a profile page, else None"""
+    match = SPACE_URL_RE.search(url or '')
+    if not match:
+        return None
+    if not match.group(2):
+        return f'profile/{match.group(1)}'
+    if pn is None or not str(pn).isdigit():
+        pn = parse_qs(urlparse(url).query).get('pn', ['1'])[0]
+    return f'page/{match.group(1)}/{pn}'
+
+
+class RecordingDriver:
+    """Wraps a WebDriver and stores a snapshot of every page the spider reads from it"""
+
+    def __init__(self, browser, cache):
+        self.__dict__.update(_browser=browser, _cache=cache, _url=None)
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+    def __setattr__(self, name, value):
+        # e.g. note_page's pages_loaded, which BrowserPool reads off the real driver
+        setattr(self._browser, name, value)
+
+    def get(self, url):
+        self.__dict__['_url'] = url
+        self._browser.get(url)
+
+    def read_page(self, pn):
+        """page_source for video list page `pn`, snapshotted under that page.
+
+        The caller says which page it's on: after a click the URL still
+        reads pn=1, and some layouts show no numbered active page button.
+        """
+        html = self._browser.page_source
+        key = snapshot_key(self._url, pn)
+        if key is not None:
+            self._cache.put_json(key, {'url': self._url, 'title': self._browser.title, 'html': html})
+        return html
+
+    @property
+    def title(self):
+        title = self._browser.title
+        key = snapshot_key(self._url)
+        if key is not None and key.startswith('profile/'):
+            self._cache.put_json(key, {'url': self._url, 'title': title, 'html': ''})
+        return title
+
+
+class SnapshotElement:
+    def __init__(self, driver, tag):
+        self.driver = driver
+        self.tag = tag
+
+    @property
+    def text(self):
+        return self.tag.get_text(' ', strip=True)
+
+    def get_attribute(self, name):
+        value = self.tag.get(name)
+        value = ' '.join(value) if isinstance(value, list) else value
+        if name == 'class' and '下一页' in self.text and not self.driver.has_page(self.driver.pn + 1):
+            # Past the last snapshot the next button reads as disabled, so paging stops there
+            value = f'{value or ""} disabled'
+        return value
+
+    def is_displayed(self):
+        # Nothing pops up over a snapshot, so there's never a dialog to close
+        return False
+
+    def click(self):
+        if '下一页' in self.text:
+            self.driver.next_page()
+
+
+class SnapshotDriver:
+    """Answers the WebDriver calls the spider makes (get, page_source, title,
+    find_elements, execute_script, refresh) from stored page snapshots.
+
+    Subclasses provide snapshot(key) for keys from snapshot_key(). CSS
+    selectors are answered with bs4, so get_total_pages and click_next_page
+    run their real code; clicking 下一页 moves to the next page's snapshot.
+    """
+
+    def __init__(self):
+        self.url = None
+        self.key = None
+        self.mid = None
+        self.pn = 1
+        self.pages_loaded = 0
+        self._soup = (None, None)
+
+    def snapshot(self, key):
+        raise NotImplementedError
+
+    def has_page(self, pn):
+        return self.snapshot(f'page/{self.mid}/{pn}') is not None
+
+    def soup(self, key, html):
+        if self._soup[0] != key:
+            self._soup = (key, BeautifulSoup(html, 'html.parser'))
+        return self._soup[1]
+
+    def _current(self):
+        snapshot = self.snapshot(self.key) if self.key else None
+        return snapshot or {'title': '', 'html': '<html></html>'}
+
+    def get(self, url):
+        self.url = url
+        self.key = snapshot_key(url)
+        match = SPACE_URL_RE.search(url)
+        self.mid = match.group(1) if match else None
+        if self.key is not None and self.key.startswith('page/'):
+            self.pn = int(self.key.rsplit('/', 1)[1])
+        if self.key is None or self.snapshot(self.key) is None:
+            raise ReplayMiss(f"{url} is not in the replay cache")
+
+    def refresh(self):
+        pass
+
+    def next_page(self):
+        if self.has_page(self.pn + 1):
+            self.pn += 1
+            self.key = f'page/{self.mid}/{self.pn}'
+
+    @property
+    def page_source(self):
+        return self._current()['html']
+
+    @property
+    def title(self):
+        return self._current()['title']
+
+    def find_elements(self, by, selector):
+        snapshot = self._current()
+        try:
+            return [SnapshotElement(self, tag) for tag in self.soup(self.key, snapshot['html']).select(selector)]
+        except Exception:
+            return []
+
+    def find_element(self, by, selector):
+        elements = self.find_elements(by, selector) if by == 'css selector' else []
+        if not elements:
+            raise NoSuchElementException(selector)
+        return elements[0]
+
+    def execute_script(self, script, *args):
+        if script == PAGE_STATE_JS:
+            html = self._current()['html']
+            soup = self.soup(self.key, html)
+            if soup.select_one(CARD_SELECTOR):
+                return 'cards'
+            text = soup.get_text()
+            if '还没有投稿视频' in text or '没有更多数据' in text:
+                return 'empty'
+            if '错误码' in text or '-352' in text or 'UPINFO_ERROR' in html:
+                return 'blocked'
+            return None
+        if script == PAGE_SIGNATURE_JS:
+            match = BVID_RE.search(self._current()['html'])
+            return [str(self.pn), match.group(0) if match else None]
+        if 'click()' in script and args and isinstance(args[0], SnapshotElement):
+            args[0].click()
+        if script == 'return 1':
+            return 1
+        return None
+
+    def quit(self):
+        pass
+
+
+class ReplayDriver(SnapshotDriver):
+    """A SnapshotDriver over what record mode stored in a ResponseCache"""
+
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+        self._snapshots = {}
+
+    def snapshot(self, key):
+        if key not in self._snapshots:
+            self._snapshots[key] = self.cache.get_json(key)
+        return self._snapshots[key]
+
+    def next_page(self):
+        # Only the current page's snapshot is kept in memory
+        self._snapshots = {self.key: self._snapshots.get(self.key)}
+        super().next_page()
+
+
+def reparse(cache, parser=None, user_ids=None):
+    """Parse every recorded space page again and upsert the videos into the store; returns videos written.
+
+    Each video keeps the time its page was recorded as fetched_at, so
+    relative dates like "3小时前" resolve as they did on the day.
+    """
+    from datetime import datetime
+    from .normalize import TS_FORMAT
+    from .spider import get_username, page_url, parse_videos_on_page
+    from .store import get_store
+
+    pages = {}
+    for key in cache.keys('page/'):
+        _, mid, pn = key.split('/')
+        if user_ids is None or mid in user_ids:
+            pages.setdefault(mid, []).append(int(pn))
+
+    written = 0
+    for mid, pns in pages.items():
+        driver = ReplayDriver(cache)
+        videos = []
+        seen = set()
+        user_name = None
+        for pn in sorted(pns):
+            driver.get(page_url(mid, pn))
+            user_name = user_name or get_username(driver, mid)
+            recorded_at = cache.stored_at(f'page/{mid}/{pn}')
+            fetched_at = datetime.fromtimestamp(recorded_at or time.time()).strftime(TS_FORMAT)
+            for url, bvid, _, title, play_count, pub_date, duration in parse_videos_on_page(driver, user_name, parser=parser):
+                if bvid in seen:
+                    continue
+                seen.add(bvid)
+                videos.append({'url': url, 'bvid': bvid, 'user_name': user_name, 'title': title,
+                               'play_count': play_count, 'pub_date': pub_date, 'duration': duration,
+                               'fetched_at': fetched_at})
+        # Pages in order are newest first, which is what upsert_videos expects
+        written += get_store().upsert_videos(mid, videos, reparsed=True)
+        print(f"Reparsed {len(pns)} pages for {user_name}: {len(videos)} videos")
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect the record/replay cache or reparse what it holds")
+    parser.add_argument('--dir', default=CACHE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help="keys, blobs and bytes on disk")
+    prune_parser = sub.add_parser('prune', help="drop entries older than the TTL")
+    prune_parser.add_argument('--ttl-hours', type=float, default=24)
+    reparse_parser = sub.add_parser('reparse', help="parse every recorded space page again into the store")
+    reparse_parser.add_argument('--parser', help="parse_html backend (bs4, lxml, selectolax)")
+    reparse_parser.add_argument('--user', action='append', help="only this user id (repeatable)")
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        stats = ResponseCache(args.dir, mode='replay', max_bytes=None).stats()
+        print(f"{stats['keys']} keys, {stats['objects']} blobs, {stats['bytes'] / (1024 * 1024):.1f} MB")
+    elif args.command == 'prune':
+        cache = ResponseCache(args.dir, ttl=args.ttl_hours * 3600, max_bytes=None)
+        print(f"Dropped {cache.prune()} entries")
+    elif args.command == 'reparse':
+        started = time.perf_counter()
+        written = reparse(ResponseCache(args.dir, mode='replay', max_bytes=None), parser=args.parser, user_ids=args.user)
+        print(f"Wrote {written} videos in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,193 @@
+"""Long-running updater that checks each followed user on their own schedule.
+
+Users sit in a heap keyed by when they are next due. After each check a
+user's interval is recomputed from how often they post: about
+`checks_per_upload` checks per typical gap between their recent uploads,
+kept within [min_interval, max_interval] and doubled for every consecutive
+failure. A token bucket caps checks per hour across all users. The
+schedule is written to data/schedule.json after every check, so a restart
+carries on where it left off. Run from the repository root:
+
+    python -m bili_spider.scheduler --backend http --budget 60
+"""
+import argparse
+import heapq
+import json
+import os
+import time
+from datetime import datetime
+
+from . import metrics
+from .cache import file_signature
+from .fetch import FetchError, HttpBackend
+from .normalize import TS_FORMAT
+from .ratelimit import RateLimiter
+from .store import get_store
+from .updater import mark_user_updated, probe_user, update_user_videos
+
+SCHEDULE_PATH = 'data/schedule.json'
+FOLLOWING_PATH = 'data/following.json'
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def polling_interval(pub_times, now=None, min_interval=HOUR, max_interval=7 * DAY, checks_per_upload=4, default=DAY):
+    """Seconds until a user's next check, from their recent pub_ts values (newest first)"""
+    now = now or datetime.now()
+    times = [datetime.strptime(t, TS_FORMAT) for t in pub_times if t]
+    if len(times) < 2:
+        gap = default * checks_per_upload
+    else:
+        gap = (times[0] - times[-1]).total_seconds() / (len(times) - 1)
+        # Someone who has been quiet for longer than their usual gap is checked less often
+        gap = max(gap, (now - times[0]).total_seconds())
+    return min(max(gap / checks_per_upload, min_interval), max_interval)
+
+
+class UpdateScheduler:
+    def __init__(self, path=SCHEDULE_PATH, following_path=FOLLOWING_PATH, budget_per_hour=60, backend='selenium',
+                 probe=True, chromedriver_path=None, requests_per_minute=20, min_interval=HOUR,
+                 max_interval=7 * DAY, history=20):
+        self.path = path
+        self.following_path = following_path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.history = history
+        self.chromedriver_path = chromedriver_path
+        self.budget = RateLimiter(rate_per_minute=budget_per_hour / 60.0)
+        self.rate_limiter = RateLimiter(rate_per_minute=requests_per_minute)
+        self.http_backend = HttpBackend(rate_limiter=self.rate_limiter) if backend == 'http' or probe else None
+        self.backend = self.http_backend if backend == 'http' else None
+        self.probe = probe
+        self.state = self._load()
+        self.following = {}
+        self._following_signature = None
+        self._heap = []
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self):
+        # Written to a temp file first so a crash mid-write can't lose the schedule
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reload_following(self):
+        """Pick up users added or removed in the app since the last look"""
+        signature = file_signature(self.following_path)
+        if signature == self._following_signature:
+            return
+        self._following_signature = signature
+        if os.path.exists(self.following_path):
+            with open(self.following_path, 'r', encoding='utf-8') as f:
+                self.following = json.load(f)
+        else:
+            self.following = {}
+
+        now = time.time()
+        for user_id in self.following:
+            self.state.setdefault(user_id, {'next_due': now, 'interval': None, 'failures': 0})
+        self._heap = [(self.state[user_id]['next_due'], user_id) for user_id in self.following]
+        heapq.heapify(self._heap)
+
+    def _mark_updated(self, user_id):
+        following = mark_user_updated(user_id, self.following_path)
+        if following is not None:
+            self.following = following
+            self._following_signature = file_signature(self.following_path)
+
+    def check_user(self, user_id):
+        """Probe and, if needed, crawl one user, then schedule their next check"""
+        entry = self.state[user_id]
+        name = self.following[user_id]['name']
+        new_count = 0
+        try:
+            changed = True
+            if self.probe:
+                try:
+                    changed = probe_user(self.http_backend, user_id)
+                except FetchError as e:
+                    print(f"Probe failed for {name} ({e}), crawling")
+            if changed:
+                new_count = update_user_videos(user_id, name, self.chromedriver_path,
+                                               rate_limiter=self.rate_limiter, backend=self.backend)
+            entry['failures'] = 0
+            entry.pop('last_error', None)
+            self._mark_updated(user_id)
+        except Exception as e:
+            entry['failures'] = entry.get('failures', 0) + 1
+            entry['last_error'] = str(e)
+            print(f"Error updating {name}: {e}")
+
+        pub_times = [v['pub_ts'] for v in get_store().videos_by_pub_ts(user_id, self.history)]
+        interval = polling_interval(pub_times, min_interval=self.min_interval, max_interval=self.max_interval)
+        interval = min(interval * 2 ** entry['failures'], self.max_interval)
+        entry.update(last_check=time.time(), last_new=new_count, interval=interval, next_due=time.time() + interval)
+        self.save()
+        heapq.heappush(self._heap, (entry['next_due'], user_id))
+        if metrics.current() is not None:
+            metrics.current().write_prometheus()
+        print(f"Checked {name}: {new_count} new, next check in {interval / HOUR:.1f}h")
+        return new_count
+
+    def _pop_due(self):
+        """(next_due, user_id) of the earliest live entry, or None"""
+        while self._heap:
+            due, user_id = self._heap[0]
+            if user_id in self.following and self.state[user_id]['next_due'] == due:
+                return due, user_id
+            # Left behind by a reschedule or a user removed from the following list
+            heapq.heappop(self._heap)
+        return None
+
+    def run(self, once=False, idle_seconds=60):
+        """Check users as they come due, forever; with `once`, only until nobody is due"""
+        print(f"Scheduler started with {len(self.state)} known users")
+        while True:
+            self.reload_following()
+            head = self._pop_due()
+            wait = idle_seconds if head is None else head[0] - time.time()
+            if wait > 0:
+                if once:
+                    return
+                # Wake up at least every idle_seconds to notice following list changes
+                time.sleep(min(wait, idle_seconds))
+                continue
+
+            heapq.heappop(self._heap)
+            self.budget.acquire('checks')
+            self.check_user(head[1])
+
+    def close(self):
+        if self.http_backend:
+            self.http_backend.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep every following user up to date on an adaptive schedule")
+    parser.add_argument('--budget', type=float, default=60, help="most user checks per hour, across all users")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium', help="read video lists through Chrome or the JSON API")
+    parser.add_argument('--rpm', type=int, default=20, help="page requests per minute")
+    parser.add_argument('--no-probe', action='store_true', help="crawl every due user instead of first checking for new videos")
+    parser.add_argument('--min-interval-hours', type=float, default=1, help="shortest time between checks of one user")
+    parser.add_argument('--max-interval-hours', type=float, default=7 * 24, help="longest time between checks of one user")
+    parser.add_argument('--once', action='store_true', help="check the users that are due now, then exit")
+    parser.add_argument('--metrics', action='store_true', help="keep data/metrics.prom up to date with timings and counters since start")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+    scheduler = UpdateScheduler(budget_per_hour=args.budget, backend=args.backend, probe=not args.no_probe,
+                                requests_per_minute=args.rpm, min_interval=args.min_interval_hours * HOUR,
+                                max_interval=args.max_interval_hours * HOUR)
+    try:
+        scheduler.run(once=args.once)
+    except KeyboardInterrupt:
+        print("Scheduler stopped")
+    finally:
+        scheduler.close()
@@ -0,0 +1,37 @@
+import re
+
+# Hiragana/katakana, CJK extension A, unified ideographs, compatibility ideographs
+CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+# Words stop at CJK, so "MIT线性代数" gives "mit" plus the run "线性代数"
+TOKEN_RE = re.compile(f'([{CJK_CHARS}]+)|([^\\W_{CJK_CHARS}]+)')
+# Bumped whenever title_tokens changes, so stores rebuild their title index
+TOKENS_VERSION = 2
+
+
+def title_tokens(title):
+    """Space-separated index terms: CJK runs as overlapping bigrams plus their last character, other words as is.
+
+    "线性代数 Lecture 3" -> "线性 性代 代数 数 lecture 3". The trailing
+    character means every character of a run starts some term, so a
+    one-character query can be answered with a prefix match.
+    """
+    terms = []
+    for cjk, word in TOKEN_RE.findall(title or ''):
+        if cjk:
+            terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            terms.append(cjk[-1])
+        else:
+            terms.append(word.lower())
+    return ' '.join(terms)
+
+
+def match_query(query):
+    """FTS5 MATCH expression requiring every bigram/word of `query`; None if it has no searchable terms"""
+    terms = []
+    for cjk, word in TOKEN_RE.findall(query or ''):
+        if cjk and len(cjk) > 1:
+            terms.extend(f'"{cjk[i:i + 2]}"' for i in range(len(cjk) - 1))
+        else:
+            # Single characters and words also match as prefixes, so results appear while typing
+            terms.append(f'"{(cjk or word).lower()}"*')
+    return ' '.join(terms) or None
@@ -1,24 +1,81 @@
 import os.path
+import queue
 import random
+import threading
 import time
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from typing import Generator, Tuple, Set
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.command import Command
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from tqdm import tqdm
 
+from . import metrics
+from .parsers import parse_html
+from .replay import RecordingDriver, ReplayDriver
+from .waits import PacingPolicy, WaitStats, page_signature, wait_for_page_change, wait_for_page_state
+
 api_user = 'https://space.bilibili.com/{}/video'
 api_profile = 'https://space.bilibili.com/{}'
 
-
-@contextmanager
-def make_chrome_browser(executable_path=None, headless=True):
+# Requests lean mode never lets out: images, fonts and media by extension,
+# cover/avatar image hosts, and bilibili's tracking and ad endpoints. The
+# static JS/CSS on s1.hdslb.com is left alone since the card list needs it.
+LEAN_BLOCKED_URLS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.m4s', '*.flv', '*.mp3', '*.webm',
+    '*://i0.hdslb.com/bfs/*', '*://i1.hdslb.com/bfs/*', '*://i2.hdslb.com/bfs/*',
+    '*://data.bilibili.com/*', '*://cm.bilibili.com/*', '*://s1.hdslb.com/bfs/seed/log/*',
+    '*://hm.baidu.com/*', '*://www.google-analytics.com/*',
+]
+
+
+# Set up on every new document of a tab: hide the usual automation tells
+STEALTH_JS = '''
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    });
+    Object.defineProperty(navigator, 'plugins', {
+        get: () => [1, 2, 3, 4, 5]
+    });
+    Object.defineProperty(navigator, 'languages', {
+        get: () => ['zh-CN', 'zh', 'en']
+    });
+    window.chrome = {
+        runtime: {}
+    };
+    Object.defineProperty(navigator, 'permissions', {
+        get: () => ({
+            query: () => Promise.resolve({ state: 'granted' })
+        })
+    });
+'''
+
+
+class CrawlIncomplete(Exception):
+    """A crawl stopped short of its last page, e.g. because the next page never loaded.
+
+    Raised after every video of `last_page` has been yielded and before
+    anything from a later page, so the pages up to `last_page` are complete.
+    """
+
+    def __init__(self, mid, last_page, total_pages):
+        super().__init__(f"Crawl of {mid} stopped after page {last_page} of {total_pages}")
+        self.mid = mid
+        self.last_page = last_page
+        self.total_pages = total_pages
+
+
+class ResumeMismatch(Exception):
+    """A resumed crawl didn't land where its checkpoint left off"""
+
+
+def launch_chrome(executable_path=None, headless=True, lean=False, multi_tab=False):
     options = webdriver.ChromeOptions()
     if headless:
         options.add_argument('--headless=new')  # Use new headless mode
@@ -46,112 +103,440 @@ def make_chrome_browser(executable_path=None, headless=True):
     options.add_experimental_option('useAutomationExtension', False)
 
     # Stealth options
-    options.add_experimental_option("prefs", {
+    prefs = {
         "credentials_enable_service": False,
         "profile.password_manager_enabled": False,
         "profile.default_content_setting_values.notifications": 2
-    })
+    }
+    if lean:
+        # Only the card markup is parsed, so nothing else needs to load or render.
+        # Eager returns from get() at DOMContentLoaded; the page-state waits
+        # take it from there.
+        prefs["profile.managed_default_content_settings.images"] = 2
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--autoplay-policy=user-gesture-required')
+        options.page_load_strategy = 'eager'
+    if multi_tab:
+        # get() returns as soon as navigation starts, so a tab waiting for its
+        # page doesn't hold up the others; background tabs must not be throttled
+        options.page_load_strategy = 'none'
+        options.add_argument('--disable-background-timer-throttling')
+        options.add_argument('--disable-backgrounding-occluded-windows')
+        options.add_argument('--disable-renderer-backgrounding')
+    options.add_experimental_option("prefs", prefs)
 
     # Add additional options for Docker/Linux environment
     options.add_argument('--disable-setuid-sandbox')
     options.add_argument('--disable-extensions')
 
-    if executable_path:
-        service = Service(executable_path=executable_path)
-        browser = webdriver.Chrome(options=options, service=service)
-    else:
-        browser = webdriver.Chrome(options=options)
-
-    # Execute stealth JavaScript
-    browser.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
-        'source': '''
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined
-            });
-            Object.defineProperty(navigator, 'plugins', {
-                get: () => [1, 2, 3, 4, 5]
-            });
-            Object.defineProperty(navigator, 'languages', {
-                get: () => ['zh-CN', 'zh', 'en']
-            });
-            window.chrome = {
-                runtime: {}
-            };
-            Object.defineProperty(navigator, 'permissions', {
-                get: () => ({
-                    query: () => Promise.resolve({ state: 'granted' })
-                })
-            });
-        '''
-    })
+    with metrics.span('driver_startup'):
+        if executable_path:
+            service = Service(executable_path=executable_path)
+            browser = webdriver.Chrome(options=options, service=service)
+        else:
+            browser = webdriver.Chrome(options=options)
+
+    prepare_tab(browser, lean=lean)
+    return browser
 
+
+def prepare_tab(browser, lean=False):
+    """Per-tab CDP setup: the stealth script and, with `lean`, the blocked URL list"""
+    browser.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': STEALTH_JS})
+    if lean:
+        browser.execute_cdp_cmd('Network.enable', {})
+        browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+
+
+@contextmanager
+def make_chrome_browser(executable_path=None, headless=True, lean=False):
+    """A Chrome session that quits on exit; `lean` blocks images, fonts, media and trackers"""
+    browser = launch_chrome(executable_path=executable_path, headless=headless, lean=lean)
     try:
         yield browser
     finally:
         browser.quit()
 
 
-def get_user_videos(browser, mid: int, max_pages: int = None, progress_callback=None) -> Generator[Tuple[str, str, str, str, str, str, str], None, None]:
-    browser.get(api_user.format(mid))
-
-    # First wait for basic page load
-    time.sleep(3)
+def note_page(browser):
+    """Count a page load against the session, used by BrowserPool for recycling"""
+    browser.pages_loaded = getattr(browser, 'pages_loaded', 0) + 1
 
-    # Check if page has anti-bot measures or errors
-    page_source = browser.page_source
-    if "错误码" in page_source or "UPINFO_ERROR" in page_source or "-352" in page_source:
-        print(f"Page blocked by anti-bot measures for user {mid}")
-        # Try refreshing once
-        browser.refresh()
-        time.sleep(5)
 
+def chrome_rss_mb(browser):
+    """Resident memory of the Chrome process tree behind a driver, or None if unknown"""
     try:
-        # Try multiple selectors for video cards
-        video_found = False
-        selectors = [
-            "bili-video-card",
-            "small-item",
-            "video-item",
-            "[class*='video-card']",
-            "[class*='video-item']"
-        ]
-
-        for selector in selectors:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        driver_proc = psutil.Process(browser.service.process.pid)
+        total = 0
+        for proc in driver_proc.children(recursive=True):
             try:
-                if selector.startswith('['):
-                    WebDriverWait(browser, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                else:
-                    WebDriverWait(browser, 10).until(
-                        EC.presence_of_element_located((By.CLASS_NAME, selector))
-                    )
-                video_found = True
-                break
-            except TimeoutException:
+                total += proc.memory_info().rss
+            except psutil.Error:
                 continue
+        return total / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class BrowserPool:
+    """Keeps warm WebDriver sessions and leases them to callers.
+
+    Sessions are health-checked before each lease and recycled after
+    `max_pages` page loads or once Chrome's RSS exceeds `max_rss_mb`. With
+    `lean`, sessions are launched in lean mode (see launch_chrome).
+    """
+
+    def __init__(self, size=1, executable_path=None, headless=True, max_pages=200, max_rss_mb=1500, lean=False):
+        self.size = size
+        self.executable_path = executable_path
+        self.headless = headless
+        self.lean = lean
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self._idle = []
+        self._leased = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'startups': 0,
+            'startup_seconds': 0.0,
+            'recycled': 0,
+            'unhealthy': 0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def lease(self):
+        browser = self._acquire()
+        healthy = True
+        try:
+            yield browser
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            self._release(browser, healthy)
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._leased >= self.size and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("BrowserPool is closed")
+            self._leased += 1
+            browser = self._idle.pop() if self._idle else None
+
+        while browser is not None and not self._is_healthy(browser):
+            with self._cond:
+                self._stats['unhealthy'] += 1
+            self._quit(browser)
+            with self._cond:
+                browser = self._idle.pop() if self._idle else None
+
+        if browser is not None:
+            with self._cond:
+                self._stats['hits'] += 1
+            return browser
 
-        if not video_found:
-            print(f"No video elements found for user {mid}, checking if user has no videos...")
-            # Check if the page says the user has no videos
-            if "还没有投稿视频" in browser.page_source or "没有更多数据" in browser.page_source:
-                print(f"User {mid} has no videos")
-                return
+        try:
+            started = time.perf_counter()
+            browser = launch_chrome(executable_path=self.executable_path, headless=self.headless, lean=self.lean)
+            elapsed = time.perf_counter() - started
+        except Exception:
+            with self._cond:
+                self._leased -= 1
+                self._cond.notify()
+            raise
+        browser.pages_loaded = 0
+        with self._cond:
+            self._stats['misses'] += 1
+            self._stats['startups'] += 1
+            self._stats['startup_seconds'] += elapsed
+        return browser
+
+    def _release(self, browser, healthy=True):
+        recycle = not healthy or self._closed or self._needs_recycle(browser)
+        if not recycle:
+            try:
+                # Drop the previous page so an idle session holds no renderer memory
+                browser.get('about:blank')
+            except Exception:
+                recycle = True
+        if recycle:
+            self._quit(browser)
+        with self._cond:
+            self._leased -= 1
+            if recycle:
+                self._stats['recycled'] += 1
             else:
-                print("Timeout waiting for page to load, continuing anyway...")
-                time.sleep(5)
+                self._idle.append(browser)
+            self._cond.notify()
+
+    def _needs_recycle(self, browser):
+        if getattr(browser, 'pages_loaded', 0) >= self.max_pages:
+            return True
+        if self.max_rss_mb:
+            rss = chrome_rss_mb(browser)
+            if rss is not None and rss > self.max_rss_mb:
+                print(f"Recycling browser session using {rss:.0f} MB")
+                return True
+        return False
+
+    @staticmethod
+    def _is_healthy(browser):
+        try:
+            return browser.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(browser):
+        try:
+            browser.quit()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['leased'] = self._leased
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['avg_startup_seconds'] = stats['startup_seconds'] / stats['startups'] if stats['startups'] else 0.0
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for browser in idle:
+            self._quit(browser)
+
+
+class TabbedBrowser:
+    """Leases tabs of one Chrome instead of whole sessions, with the same lease() as BrowserPool.
+
+    Every WebDriver command goes through a lock that first switches Chrome
+    to the calling thread's tab, so up to `tabs` threads can each run their
+    own crawl (get_user_videos etc.) on the one driver. Chrome is launched
+    in multi_tab mode, where get() doesn't wait for the page; the lock is
+    only held per command, so while one tab waits for its cards or sleeps
+    between pages the others keep going. A lease belongs to the thread
+    that took it. Costs one browser process instead of `tabs` of them.
+    """
+
+    def __init__(self, tabs=4, executable_path=None, headless=True, lean=False):
+        self.size = tabs
+        self.executable_path = executable_path
+        self.headless = headless
+        self.lean = lean
+        self._browser = None
+        self._execute = None
+        self._broken = False
+        self._current = None
+        self._leased = 0
+        self._closed = False
+        self._lock = threading.RLock()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'startups': 0,
+            'startup_seconds': 0.0,
+            'recycled': 0,
+            'unhealthy': 0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def lease(self):
+        with self._cond:
+            while self._leased >= self.size and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("TabbedBrowser is closed")
+            self._leased += 1
+        healthy = True
+        try:
+            browser, handle = self._open_tab()
+            try:
+                yield browser
+            except WebDriverException:
+                healthy = False
+                raise
+            finally:
+                self._close_tab(handle, healthy)
+        finally:
+            with self._cond:
+                self._leased -= 1
+                self._cond.notify()
+
+    def _launch(self):
+        started = time.perf_counter()
+        browser = launch_chrome(executable_path=self.executable_path, headless=self.headless, lean=self.lean,
+                                multi_tab=True)
+        browser.pages_loaded = 0
+        # The first window stays open on about:blank so closing the last tab doesn't end the session
+        self._execute = browser.execute
+        self._current = browser.current_window_handle
+        browser.execute = self._tab_execute
+        self._stats['startups'] += 1
+        self._stats['startup_seconds'] += time.perf_counter() - started
+        return browser
+
+    def _open_tab(self):
+        with self._lock:
+            if self._broken and self._browser is not None:
+                self._stats['recycled'] += 1
+                BrowserPool._quit(self._browser)
+                self._browser = None
+            if self._browser is None:
+                self._stats['misses'] += 1
+                self._broken = False
+                self._browser = self._launch()
+            else:
+                self._stats['hits'] += 1
+            handle = self._execute(Command.NEW_WINDOW, {'type': 'tab'})['value']['handle']
+            self._execute(Command.SWITCH_TO_WINDOW, {'handle': handle})
+            self._current = handle
+            self._local.handle = handle
+            prepare_tab(self._browser, lean=self.lean)
+            return self._browser, handle
+
+    def _close_tab(self, handle, healthy=True):
+        with self._lock:
+            self._local.handle = None
+            try:
+                if self._current != handle:
+                    self._execute(Command.SWITCH_TO_WINDOW, {'handle': handle})
+                self._execute(Command.CLOSE)
+            except Exception:
+                healthy = False
+            self._current = None
+            if not healthy and not BrowserPool._is_healthy(self._browser):
+                # Relaunched by the next lease; tabs still leased fail on their own
+                self._stats['unhealthy'] += 1
+                self._broken = True
+
+    def _tab_execute(self, command, params=None):
+        handle = getattr(self._local, 'handle', None)
+        with self._lock:
+            if handle is not None and handle != self._current:
+                self._execute(Command.SWITCH_TO_WINDOW, {'handle': handle})
+                self._current = handle
+            if command in (Command.GET, Command.REFRESH):
+                # With get() not waiting, the old document stays up until the new
+                # one commits; clear it so page-state waits can't match stale cards
+                try:
+                    self._execute(Command.W3C_EXECUTE_SCRIPT,
+                                  {'script': "document.documentElement.innerHTML = '';", 'args': []})
+                except WebDriverException:
+                    pass
+            return self._execute(command, params)
+
+    def rss_mb(self):
+        return chrome_rss_mb(self._browser) if self._browser is not None else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self.size - self._leased
+        stats['leased'] = self._leased
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['avg_startup_seconds'] = stats['startup_seconds'] / stats['startups'] if stats['startups'] else 0.0
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        with self._lock:
+            if self._browser is not None:
+                BrowserPool._quit(self._browser)
+                self._browser = None
+
+
+def page_url(mid, pn):
+    """The space video list opened straight on page `pn`"""
+    return api_user.format(mid) + f'?tid=0&pn={pn}&keyword=&order=pubdate'
+
+
+def goto_page(browser, mid, pn, rate_limiter=None, wait_stats=None):
+    """Load page `pn` by URL; False unless the cards show up with `pn` as the active page"""
+    if rate_limiter:
+        rate_limiter.acquire_url(api_user.format(mid))
+    with metrics.span('page_load'):
+        browser.get(page_url(mid, pn))
+    note_page(browser)
+    state = wait_for_page_state(browser, wait_stats=wait_stats)
+    if state == 'blocked':
+        metrics.count('antibot_blocks')
+    if state != 'cards':
+        return False
+    return page_signature(browser)[0] == str(pn)
+
+
+def get_user_videos(browser, mid: int, max_pages: int = None, progress_callback=None, rate_limiter=None,
+                    pacing=None, wait_stats=None, high_water_mark=None, start_page=1) -> Generator[Tuple[str, str, str, str, str, str, str], None, None]:
+    pacing = pacing or PacingPolicy()
+    wait_stats = wait_stats if wait_stats is not None else WaitStats()
+
+    if rate_limiter:
+        rate_limiter.acquire_url(api_user.format(mid))
+    with metrics.span('page_load'):
+        browser.get(api_user.format(mid) if start_page == 1 else page_url(mid, start_page))
+
+    # Wait for the page to tell us what it is instead of sleeping a fixed time
+    state = wait_for_page_state(browser, wait_stats=wait_stats)
+    if state == 'blocked':
+        print(f"Page blocked by anti-bot measures for user {mid}")
+        metrics.count('antibot_blocks')
+        # Try refreshing once
+        with metrics.span('page_load'):
+            browser.refresh()
+        state = wait_for_page_state(browser, wait_stats=wait_stats)
+
+    if state == 'empty':
+        print(f"User {mid} has no videos")
+        return
+    elif state != 'cards':
+        print(f"No video elements found for user {mid}, continuing anyway...")
+    if start_page > 1 and page_signature(browser)[0] != str(start_page):
+        # Same check as goto_page: the site may ignore pn and show page 1
+        raise ResumeMismatch(f"Asked for page {start_page} of {mid}, got page {page_signature(browser)[0] or '?'}")
 
-    except Exception as e:
-        print(f"Error waiting for page elements: {e}")
-        time.sleep(5)
-    
     user_name = get_username(browser, mid)
-    total_pages = get_total_pages(browser)
-    
-    if max_pages:
-        total_pages = min(total_pages, max_pages)
-    
-    print(f"Found {total_pages} pages for user {user_name}")
+    if high_water_mark is not None:
+        # Incremental run: read until the stored videos show up, without counting pages first
+        total_pages = max_pages
+        print(f"Reading new videos for user {user_name} down to {high_water_mark.bvid}")
+    else:
+        total_pages = get_total_pages(browser)
+
+        if max_pages:
+            total_pages = min(total_pages, max_pages)
+
+        print(f"Found {total_pages} pages for user {user_name}")
     
     processed_bvids = set()
     
@@ -159,26 +544,47 @@ def get_user_videos(browser, mid: int, max_pages: int = None, progress_callback=
     if not progress_callback:
         p_bar = tqdm(total=total_pages, desc=f"Grabbing videos for {user_name}")
     
-    current_page = 1
-    while current_page <= total_pages:
+    current_page = start_page
+    while total_pages is None or current_page <= total_pages:
         if progress_callback:
-            progress_callback(current_page, total_pages, f"正在读取第 {current_page}/{total_pages} 页")
+            if total_pages:
+                progress_callback(current_page, total_pages, f"正在读取第 {current_page}/{total_pages} 页")
+            else:
+                progress_callback(current_page, 0, f"正在读取第 {current_page} 页")
         else:
             p_bar.set_postfix(page=current_page)
         
-        videos = parse_videos_on_page(browser, user_name)
+        videos = parse_videos_on_page(browser, user_name, pn=current_page)
+        note_page(browser)
         
+        reached = False
         for video in videos:
+            if high_water_mark is not None and high_water_mark.reached(video):
+                print(f"Reached stored videos at {video[1]} on page {current_page}")
+                reached = True
+                break
             bvid = video[1]
             if bvid not in processed_bvids:
                 processed_bvids.add(bvid)
                 yield video
-        
-        if current_page < total_pages:
-            if not click_next_page(browser):
-                print(f"Failed to navigate to page {current_page + 1}")
+
+        if reached:
+            break
+
+        if total_pages is None or current_page < total_pages:
+            pacing.pace(wait_stats)
+            if rate_limiter:
+                rate_limiter.acquire_url(api_user.format(mid))
+            before = page_signature(browser)
+            with metrics.span('paginate'):
+                clicked = click_next_page(browser)
+            if not clicked:
+                if total_pages is not None:
+                    print(f"Failed to navigate to page {current_page + 1}")
+                    raise CrawlIncomplete(mid, current_page, total_pages)
                 break
-            time.sleep(2 + random.random())
+            if wait_for_page_change(browser, before, wait_stats=wait_stats) is None:
+                print(f"Page {current_page + 1} did not appear to load, parsing what is there")
         
         current_page += 1
         if not progress_callback:
@@ -187,6 +593,117 @@ def get_user_videos(browser, mid: int, max_pages: int = None, progress_callback=
     if not progress_callback:
         p_bar.close()
 
+    print(f"Waits for {user_name}: {wait_stats.format()}")
+
+
+def get_user_videos_parallel(pool, mid, sessions=3, max_pages=None, progress_callback=None, rate_limiter=None,
+                             pacing=None, wait_stats=None):
+    """Full crawl that opens pages by URL in up to `sessions` browsers from `pool` at once.
+
+    Page 1 gives the page count; pages 2..N are then handed to whichever
+    session is free. Videos still come out in page order, deduplicated by
+    bvid, exactly as get_user_videos would yield them. If the site ignores
+    the pn parameter, this falls back to clicking through the pages.
+    """
+    pacing = pacing or PacingPolicy()
+    wait_stats = wait_stats if wait_stats is not None else WaitStats()
+    processed_bvids = set()
+
+    def fresh(videos):
+        for video in videos:
+            if video[1] not in processed_bvids:
+                processed_bvids.add(video[1])
+                yield video
+
+    with pool.lease() as browser:
+        if rate_limiter:
+            rate_limiter.acquire_url(api_user.format(mid))
+        with metrics.span('page_load'):
+            browser.get(api_user.format(mid))
+        note_page(browser)
+        state = wait_for_page_state(browser, wait_stats=wait_stats)
+        if state == 'blocked':
+            metrics.count('antibot_blocks')
+        if state == 'empty':
+            print(f"User {mid} has no videos")
+            return
+        user_name = get_username(browser, mid)
+        total_pages = get_total_pages(browser)
+        if max_pages:
+            total_pages = min(total_pages, max_pages)
+        print(f"Found {total_pages} pages for user {user_name}, reading them with up to {sessions} sessions")
+        if progress_callback:
+            progress_callback(1, total_pages, f"正在读取第 1/{total_pages} 页")
+        first = parse_videos_on_page(browser, user_name)
+        if total_pages == 1:
+            yield from fresh(first)
+            return
+
+        # Page 2 doubles as the check that direct navigation works here
+        pacing.pace(wait_stats)
+        if not goto_page(browser, mid, 2, rate_limiter, wait_stats):
+            print("Pages can't be opened by URL here, clicking through them instead")
+            yield from fresh(first)
+            yield from fresh(get_user_videos(browser, mid, max_pages, progress_callback, rate_limiter, pacing, wait_stats))
+            return
+        results = {1: first, 2: parse_videos_on_page(browser, user_name)}
+
+    pending = queue.Queue()
+    for pn in range(3, total_pages + 1):
+        pending.put(pn)
+    cond = threading.Condition()
+    stop = threading.Event()
+    alive = [0]
+
+    def worker():
+        try:
+            with pool.lease() as session:
+                while not stop.is_set():
+                    try:
+                        pn = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    videos = None
+                    for attempt in range(2):
+                        try:
+                            pacing.pace(wait_stats)
+                            if goto_page(session, mid, pn, rate_limiter, wait_stats):
+                                videos = parse_videos_on_page(session, user_name)
+                                break
+                        except Exception as e:
+                            print(f"Error loading page {pn}: {e}")
+                    with cond:
+                        results[pn] = videos
+                        cond.notify_all()
+        finally:
+            with cond:
+                alive[0] -= 1
+                cond.notify_all()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(sessions, total_pages - 2))]
+    alive[0] = len(threads)
+    for thread in threads:
+        thread.start()
+
+    try:
+        for pn in range(1, total_pages + 1):
+            with cond:
+                while pn not in results and alive[0] > 0:
+                    cond.wait()
+                videos = results.pop(pn, None)
+            if videos is None:
+                # Same as a failed click in get_user_videos
+                print(f"Failed to load page {pn}, stopping")
+                raise CrawlIncomplete(mid, pn - 1, total_pages)
+            if progress_callback and pn > 1:
+                progress_callback(pn, total_pages, f"正在读取第 {pn}/{total_pages} 页")
+            yield from fresh(videos)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"Waits for {user_name}: {wait_stats.format()}")
+
 
 def get_username(browser, mid):
     try:
@@ -216,13 +733,30 @@ def get_username(browser, mid):
     return f"User_{mid}"
 
 
-def get_user_nickname(mid: int, executable_path=None):
-    """Fetch user nickname from their profile page"""
-    with make_chrome_browser(executable_path=executable_path, headless=True) as browser:
+def get_user_nickname(mid: int, executable_path=None, pool=None, rate_limiter=None, cache=None):
+    """Fetch user nickname from their profile page; `cache` is a replay.ResponseCache to record to or replay from"""
+    if cache is not None and cache.mode == 'replay':
+        session = nullcontext(ReplayDriver(cache))
+        rate_limiter = None
+    elif pool is not None:
+        session = pool.lease()
+    else:
+        session = make_chrome_browser(executable_path=executable_path, headless=True)
+    with session as browser:
+        if cache is not None and cache.mode == 'record':
+            browser = RecordingDriver(browser, cache)
+        if rate_limiter:
+            rate_limiter.acquire_url(api_profile.format(mid))
         browser.get(api_profile.format(mid))
+        note_page(browser)
 
-        # Wait longer for dynamic content to load
-        time.sleep(3)
+        # Give the title up to 3s to fill in, returning as soon as it does
+        try:
+            WebDriverWait(browser, 3, poll_frequency=0.1).until(
+                lambda driver: driver.title and '的个人空间' in driver.title
+            )
+        except TimeoutException:
+            pass
 
         try:
             # First, always try to get from page title as it's most reliable
@@ -277,6 +811,11 @@ def get_user_nickname(mid: int, executable_path=None):
 
 
 def get_total_pages(browser):
+    with metrics.span('total_pages'):
+        return _read_total_pages(browser)
+
+
+def _read_total_pages(browser):
     try:
         # Try multiple selectors for pagination
         selectors = [
@@ -331,71 +870,15 @@ def get_total_pages(browser):
     return 1
 
 
-def parse_videos_on_page(browser, user_name):
-    videos = []
-    html = BeautifulSoup(browser.page_source, "html.parser")
-
-    # Try multiple selectors for video cards
-    video_cards = []
-
-    # First try the new format
-    video_cards = html.find_all('div', class_='bili-video-card')
-
-    # If no cards found, try alternative selectors
-    if not video_cards:
-        video_cards = html.find_all('div', class_='small-item')
-
-    if not video_cards:
-        video_cards = html.find_all('div', class_='video-item')
-
-    if not video_cards:
-        # Try finding any div with video in the class name
-        video_cards = html.find_all('div', class_=lambda x: x and 'video' in x.lower())
-
-    for card in video_cards:
-        try:
-            link_elem = card.find('a')
-            if not link_elem or not link_elem.get('href'):
-                continue
-            
-            url = link_elem['href']
-            if not url.startswith('http'):
-                url = 'https:' + url
-            
-            url = url.split('?')[0]
-            bvid = url.strip("/").split("/")[-1]
-            
-            title = "Unknown"
-            title_elem = card.find('div', class_='bili-video-card__title')
-            if title_elem and title_elem.find('a'):
-                title = title_elem.find('a').text.strip()
-            elif link_elem.text:
-                title = link_elem.text.strip()
-            
-            play_count = "0"
-            duration = "00:00"
-            
-            cover_elem = card.find('div', class_='bili-video-card__cover')
-            if cover_elem:
-                spans = cover_elem.find_all('span')
-                if len(spans) >= 1:
-                    play_count = spans[0].text.strip()
-                for span in spans:
-                    if ':' in span.text:
-                        duration = span.text.strip()
-                        break
-            
-            pub_date = "Unknown"
-            subtitle_elem = card.find('div', class_='bili-video-card__subtitle')
-            if subtitle_elem:
-                pub_date = subtitle_elem.text.strip()
-            
-            videos.append((url, bvid, user_name, title, play_count, pub_date, duration))
-            
-        except Exception as e:
-            print(f"Error parsing video card: {e}")
-            continue
-    
+def parse_videos_on_page(browser, user_name, parser=None, pn=None):
+    """The videos on the page `browser` shows; `pn` is the list page it's on, for a RecordingDriver's snapshot"""
+    read_page = getattr(browser, 'read_page', None)
+    with metrics.span('page_source'):
+        html = read_page(pn) if read_page is not None and pn is not None else browser.page_source
+    with metrics.span('parse'):
+        videos = parse_html(html, user_name, parser=parser)
+    metrics.count('pages')
+    metrics.count('cards', len(videos))
     return videos
 
 
@@ -406,7 +889,6 @@ def click_next_page(browser):
             for btn in close_buttons:
                 if btn.is_displayed():
                     btn.click()
-                    time.sleep(0.5)
         except:
             pass
         
@@ -429,7 +911,6 @@ def click_next_page(browser):
         
         if next_button:
             browser.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_button)
-            time.sleep(0.5)
             
             try:
                 next_button.click()
@@ -440,7 +921,6 @@ def click_next_page(browser):
                     from selenium.webdriver import ActionChains
                     ActionChains(browser).move_to_element(next_button).click().perform()
             
-            time.sleep(2)
             return True
         else:
             print("Next button not found or disabled")
@@ -458,7 +938,6 @@ def click_next_page(browser):
                     }
                 }
             """)
-            time.sleep(2)
             return True
         except:
             return False
\ No newline at end of file
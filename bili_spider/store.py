@@ -0,0 +1,479 @@
+import argparse
+import glob
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from .normalize import normalize_videos
+from .search import TOKENS_VERSION, match_query, title_tokens
+
+DB_PATH = 'data/videos.db'
+
+VIDEO_COLUMNS = ['url', 'bvid', 'user_name', 'title', 'play_count', 'pub_date', 'duration', 'fetched_at']
+NORMALIZED_COLUMNS = ['pub_ts', 'play_count_int']
+
+# Keyed per user: a co-authored video (联合投稿) is listed by every followed author
+VIDEOS_TABLE = '''
+CREATE TABLE IF NOT EXISTS videos (
+    bvid TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    url TEXT,
+    user_name TEXT,
+    title TEXT,
+    play_count TEXT,
+    pub_date TEXT,
+    duration TEXT,
+    fetched_at TEXT,
+    pub_ts TEXT,
+    play_count_int INTEGER,
+    PRIMARY KEY (user_id, bvid)
+)'''
+
+SCHEMA = VIDEOS_TABLE + ''';
+CREATE INDEX IF NOT EXISTS idx_videos_user ON videos(user_id);
+CREATE TABLE IF NOT EXISTS manifest (
+    user_id TEXT PRIMARY KEY,
+    video_count INTEGER NOT NULL,
+    newest_bvid TEXT,
+    newest_pub_date TEXT,
+    last_modified TEXT
+);
+-- Title search terms (see search.title_tokens), rowid = videos.rowid
+CREATE VIRTUAL TABLE IF NOT EXISTS title_index USING fts5(tokens);
+-- Small store-wide settings, e.g. which title_tokens version built title_index
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+-- Videos from crawls still in progress, newest first by seq, merged into videos when the crawl finishes
+CREATE TABLE IF NOT EXISTS staged_videos (
+    seq INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    bvid TEXT NOT NULL,
+    url TEXT,
+    user_name TEXT,
+    title TEXT,
+    play_count TEXT,
+    pub_date TEXT,
+    duration TEXT,
+    fetched_at TEXT,
+    pub_ts TEXT,
+    play_count_int INTEGER,
+    tokens TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_staged_user ON staged_videos(user_id, seq);
+-- Where each unfinished crawl got to, so the next run can pick it up
+CREATE TABLE IF NOT EXISTS checkpoints (
+    user_id TEXT PRIMARY KEY,
+    last_page INTEGER NOT NULL,
+    last_bvid TEXT,
+    total_pages INTEGER,
+    updated_at TEXT
+);
+'''
+
+STORED_COLUMNS = ('bvid, user_id, url, user_name, title, play_count, pub_date, duration, fetched_at, '
+                  'pub_ts, play_count_int')
+UPSERT_CONFLICT = '''ON CONFLICT(user_id, bvid) DO UPDATE SET
+                    title = excluded.title,
+                    play_count = excluded.play_count,
+                    play_count_int = excluded.play_count_int,
+                    user_name = excluded.user_name,
+                    fetched_at = excluded.fetched_at'''
+# A reparse re-reads the dates too, which a crawl leaves as first stored
+REPARSE_CONFLICT = UPSERT_CONFLICT + ''',
+                    pub_date = excluded.pub_date,
+                    pub_ts = excluded.pub_ts'''
+
+
+class VideoStore:
+    """SQLite store for every followed user's videos, keyed by (user_id, bvid).
+
+    Runs in WAL mode so the app can read while the updater writes. Rows are
+    only ever upserted; nothing is rewritten wholesale. Each thread gets its
+    own connection. Within a user, rowid order is fetch order, so newer
+    uploads have higher rowids. A long crawl stages its videos page by page
+    next to a checkpoint and only merges them into videos once it's done,
+    which keeps that order (and the manifest's newest video) intact.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._write_listeners = []
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        self._migrate_schema(conn)
+        # Databases created before the manifest existed get it built once
+        if conn.execute('SELECT 1 FROM manifest LIMIT 1').fetchone() is None:
+            self.rebuild_manifest()
+        # Likewise the title index, for databases created before search existed
+        # or indexed with an older title_tokens
+        tokens_version = conn.execute("SELECT value FROM meta WHERE key = 'tokens_version'").fetchone()
+        if conn.execute('SELECT 1 FROM videos LIMIT 1').fetchone() is None:
+            with conn:
+                self._set_tokens_version(conn)
+        elif (conn.execute('SELECT 1 FROM title_index LIMIT 1').fetchone() is None
+                or tokens_version is None or tokens_version[0] != str(TOKENS_VERSION)):
+            self.rebuild_search_index()
+
+    def _migrate_schema(self, conn):
+        columns = {row[1]: row[5] for row in conn.execute('PRAGMA table_info(videos)')}
+        added = False
+        for column, sql_type in (('pub_ts', 'TEXT'), ('play_count_int', 'INTEGER')):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE videos ADD COLUMN {column} {sql_type}')
+                added = True
+        if not columns.get('user_id'):
+            self._rekey_videos(conn)
+        with conn:
+            # The raw pub_date strings ("03-15", "3小时前") don't sort; pub_ts does
+            conn.execute('DROP INDEX IF EXISTS idx_videos_user_pub')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_videos_user_ts ON videos(user_id, pub_ts)')
+        if added:
+            self.backfill_normalized()
+
+    def _rekey_videos(self, conn):
+        """Rebuild a videos table keyed by bvid alone as one keyed by (user_id, bvid), keeping rowids"""
+        conn.execute('BEGIN')
+        try:
+            conn.execute('ALTER TABLE videos RENAME TO videos_by_bvid')
+            conn.execute(VIDEOS_TABLE)
+            conn.execute(f'INSERT INTO videos (rowid, {STORED_COLUMNS}) SELECT rowid, {STORED_COLUMNS} FROM videos_by_bvid')
+            conn.execute('DROP TABLE videos_by_bvid')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_videos_user ON videos(user_id)')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        print("Rekeyed the videos table by (user_id, bvid)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def existing_bvids(self, user_id):
+        rows = self._conn().execute('SELECT bvid FROM videos WHERE user_id = ?', (str(user_id),))
+        return {row[0] for row in rows}
+
+    def upsert_videos(self, user_id, videos, reparsed=False):
+        """Insert new videos or refresh existing ones; `videos` is newest first.
+
+        With `reparsed` (replay.reparse), pub_date and pub_ts are rewritten too.
+        """
+        if not videos:
+            return 0
+        conn = self._conn()
+        # Typed columns are computed once here so readers only ever sort them
+        normalize_videos(videos)
+        # Insert oldest first so newer uploads end up with higher rowids
+        rows = [(v['bvid'], str(user_id), v['url'], v['user_name'], v['title'], v['play_count'],
+                 v['pub_date'], v['duration'], v['fetched_at'], v['pub_ts'], v['play_count_int'])
+                for v in reversed(videos)]
+        with conn:
+            conn.executemany(f'''
+                INSERT INTO videos ({STORED_COLUMNS})
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                {REPARSE_CONFLICT if reparsed else UPSERT_CONFLICT}
+            ''', rows)
+            # An upsert keeps the row's rowid, so replacing by rowid also covers retitled videos
+            conn.executemany('INSERT OR REPLACE INTO title_index (rowid, tokens) '
+                             'SELECT rowid, ? FROM videos WHERE user_id = ? AND bvid = ?',
+                             [(title_tokens(v['title']), str(user_id), v['bvid']) for v in videos])
+            self._refresh_manifest(conn, str(user_id))
+        self._notify_write(user_id)
+        return len(rows)
+
+    def stage_videos(self, user_id, videos, last_page, last_bvid=None, total_pages=None):
+        """Keep a crawl's videos up to `last_page` (newest first) and move its checkpoint there, in one transaction"""
+        conn = self._conn()
+        normalize_videos(videos)
+        rows = [(str(user_id), v['bvid'], v['url'], v['user_name'], v['title'], v['play_count'], v['pub_date'],
+                 v['duration'], v['fetched_at'], v['pub_ts'], v['play_count_int'], title_tokens(v['title']))
+                for v in videos]
+        with conn:
+            conn.executemany('''
+                INSERT INTO staged_videos (user_id, bvid, url, user_name, title, play_count, pub_date, duration,
+                                           fetched_at, pub_ts, play_count_int, tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.execute('''
+                INSERT OR REPLACE INTO checkpoints (user_id, last_page, last_bvid, total_pages, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (str(user_id), last_page, last_bvid, total_pages or None, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        return len(rows)
+
+    def checkpoint(self, user_id):
+        """The unfinished crawl for a user as {last_page, last_bvid, total_pages, updated_at, staged}, or None"""
+        conn = self._conn()
+        row = conn.execute('SELECT last_page, last_bvid, total_pages, updated_at FROM checkpoints WHERE user_id = ?',
+                           (str(user_id),)).fetchone()
+        if row is None:
+            return None
+        staged = conn.execute('SELECT COUNT(*) FROM staged_videos WHERE user_id = ?', (str(user_id),)).fetchone()[0]
+        return {'last_page': row[0], 'last_bvid': row[1], 'total_pages': row[2], 'updated_at': row[3], 'staged': staged}
+
+    def checkpoints(self):
+        return {row[0]: self.checkpoint(row[0]) for row in self._conn().execute('SELECT user_id FROM checkpoints').fetchall()}
+
+    def staged_bvids(self, user_id):
+        rows = self._conn().execute('SELECT bvid FROM staged_videos WHERE user_id = ?', (str(user_id),))
+        return {row[0] for row in rows}
+
+    def commit_staged(self, user_id):
+        """Merge a finished crawl's staged videos into videos, oldest first, and drop its checkpoint"""
+        conn = self._conn()
+        user_id = str(user_id)
+        with conn:
+            count = conn.execute('SELECT COUNT(*) FROM staged_videos WHERE user_id = ?', (user_id,)).fetchone()[0]
+            if count:
+                # Highest seq is the oldest video, so this keeps newer uploads at higher rowids
+                conn.execute(f'''
+                    INSERT INTO videos ({STORED_COLUMNS})
+                    SELECT {STORED_COLUMNS} FROM staged_videos WHERE user_id = ? ORDER BY seq DESC
+                    {UPSERT_CONFLICT}
+                ''', (user_id,))
+                conn.execute('''
+                    INSERT OR REPLACE INTO title_index (rowid, tokens)
+                    SELECT v.rowid, s.tokens FROM staged_videos s JOIN videos v ON v.user_id = s.user_id AND v.bvid = s.bvid
+                    WHERE s.user_id = ?
+                ''', (user_id,))
+                conn.execute('DELETE FROM staged_videos WHERE user_id = ?', (user_id,))
+                self._refresh_manifest(conn, user_id)
+            conn.execute('DELETE FROM checkpoints WHERE user_id = ?', (user_id,))
+        if count:
+            self._notify_write(user_id)
+        return count
+
+    def discard_staged(self, user_id):
+        """Forget an unfinished crawl, so the next one starts over"""
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM staged_videos WHERE user_id = ?', (str(user_id),))
+            conn.execute('DELETE FROM checkpoints WHERE user_id = ?', (str(user_id),))
+
+    def add_write_listener(self, callback):
+        """Call `callback(user_id)` after every write to that user's videos"""
+        self._write_listeners.append(callback)
+
+    def _notify_write(self, user_id):
+        for callback in self._write_listeners:
+            callback(str(user_id))
+
+    def _refresh_manifest(self, conn, user_id):
+        count = conn.execute('SELECT COUNT(*) FROM videos WHERE user_id = ?', (user_id,)).fetchone()[0]
+        if not count:
+            conn.execute('DELETE FROM manifest WHERE user_id = ?', (user_id,))
+            return
+        newest = conn.execute('SELECT bvid, COALESCE(pub_ts, pub_date) FROM videos WHERE user_id = ? ORDER BY rowid DESC LIMIT 1',
+                              (user_id,)).fetchone()
+        conn.execute('''
+            INSERT OR REPLACE INTO manifest (user_id, video_count, newest_bvid, newest_pub_date, last_modified)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, count, newest[0], newest[1], datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def rebuild_manifest(self):
+        conn = self._conn()
+        with conn:
+            for (user_id,) in conn.execute('SELECT DISTINCT user_id FROM videos').fetchall():
+                self._refresh_manifest(conn, user_id)
+
+    def user_version(self, user_id):
+        """(video_count, last_modified) from the manifest; changes whenever the user's videos do"""
+        return self._conn().execute('SELECT video_count, last_modified FROM manifest WHERE user_id = ?',
+                                    (str(user_id),)).fetchone()
+
+    def manifest(self):
+        """Per-user video count, newest bvid/pub date and last write, without touching the videos table"""
+        rows = self._conn().execute(
+            'SELECT user_id, video_count, newest_bvid, newest_pub_date, last_modified FROM manifest')
+        return {
+            row[0]: {'video_count': row[1], 'newest_bvid': row[2], 'newest_pub_date': row[3], 'last_modified': row[4]}
+            for row in rows
+        }
+
+    def manifest_entry(self, user_id):
+        row = self._conn().execute(
+            'SELECT video_count, newest_bvid, newest_pub_date, last_modified FROM manifest WHERE user_id = ?',
+            (str(user_id),)).fetchone()
+        if row is None:
+            return None
+        return {'video_count': row[0], 'newest_bvid': row[1], 'newest_pub_date': row[2], 'last_modified': row[3]}
+
+    def count(self, user_id):
+        return self._conn().execute('SELECT COUNT(*) FROM videos WHERE user_id = ?', (str(user_id),)).fetchone()[0]
+
+    def has_user(self, user_id):
+        row = self._conn().execute('SELECT 1 FROM videos WHERE user_id = ? LIMIT 1', (str(user_id),)).fetchone()
+        return row is not None
+
+    def load_user_frame(self, user_id):
+        """A user's videos as a DataFrame with the old CSV columns plus pub_ts/play_count_int, newest first"""
+        return pd.read_sql_query(
+            f"SELECT {', '.join(VIDEO_COLUMNS + NORMALIZED_COLUMNS)} FROM videos WHERE user_id = ? ORDER BY rowid DESC",
+            self._conn(), params=(str(user_id),))
+
+    def videos_by_pub_ts(self, user_id, limit, since=None, before=None):
+        """Up to `limit` of a user's videos newest first by (pub_ts, rowid), after `since` and strictly before `before`"""
+        sql = f"SELECT {', '.join(VIDEO_COLUMNS + NORMALIZED_COLUMNS)}, user_id, rowid FROM videos WHERE user_id = ? AND pub_ts IS NOT NULL"
+        params = [str(user_id)]
+        if since is not None:
+            sql += ' AND pub_ts > ?'
+            params.append(since)
+        if before is not None:
+            sql += ' AND (pub_ts < ? OR (pub_ts = ? AND rowid < ?))'
+            params.extend([before[0], before[0], before[1]])
+        sql += ' ORDER BY pub_ts DESC, rowid DESC LIMIT ?'
+        params.append(limit)
+        cursor = self._conn().execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def search(self, query, limit=50, user_id=None):
+        """Videos whose titles contain every bigram/word of `query`, best bm25 match first, across all users"""
+        expression = match_query(query)
+        columns = ['user_id', 'bvid'] + [c for c in VIDEO_COLUMNS + NORMALIZED_COLUMNS if c != 'bvid']
+        if expression is None:
+            return pd.DataFrame(columns=columns + ['score'])
+        sql = f'''
+            SELECT {', '.join('v.' + c for c in columns)}, bm25(title_index) AS score
+            FROM title_index JOIN videos v ON v.rowid = title_index.rowid
+            WHERE title_index MATCH ?
+        '''
+        params = [expression]
+        if user_id is not None:
+            sql += ' AND v.user_id = ?'
+            params.append(str(user_id))
+        sql += ' ORDER BY score, v.play_count_int DESC LIMIT ?'
+        params.append(limit)
+        return pd.read_sql_query(sql, self._conn(), params=params)
+
+    def rebuild_search_index(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM title_index')
+            conn.executemany('INSERT INTO title_index (rowid, tokens) VALUES (?, ?)',
+                             ((rowid, title_tokens(title))
+                              for rowid, title in conn.execute('SELECT rowid, title FROM videos').fetchall()))
+            self._set_tokens_version(conn)
+        count = conn.execute('SELECT COUNT(*) FROM title_index').fetchone()[0]
+        print(f"Indexed {count} video titles for search")
+        return count
+
+    def _set_tokens_version(self, conn):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tokens_version', ?)", (str(TOKENS_VERSION),))
+
+    def backfill_normalized(self, chunk_size=5000):
+        """Fill pub_ts/play_count_int for rows stored before they existed"""
+        conn = self._conn()
+        updated = 0
+        while True:
+            rows = conn.execute('''
+                SELECT rowid, pub_date, fetched_at, play_count FROM videos
+                WHERE play_count_int IS NULL LIMIT ?
+            ''', (chunk_size,)).fetchall()
+            if not rows:
+                break
+            videos = normalize_videos([{'rowid': r[0], 'pub_date': r[1], 'fetched_at': r[2], 'play_count': r[3]}
+                                       for r in rows])
+            with conn:
+                conn.executemany('UPDATE videos SET pub_ts = ?, play_count_int = ? WHERE rowid = ?',
+                                 [(v['pub_ts'], v['play_count_int'], v['rowid']) for v in videos])
+            updated += len(videos)
+        if updated:
+            print(f"Backfilled normalized columns for {updated} videos")
+            self.rebuild_manifest()
+        return updated
+
+    def delete_user(self, user_id):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM title_index WHERE rowid IN (SELECT rowid FROM videos WHERE user_id = ?)',
+                         (str(user_id),))
+            conn.execute('DELETE FROM videos WHERE user_id = ?', (str(user_id),))
+            conn.execute('DELETE FROM manifest WHERE user_id = ?', (str(user_id),))
+            conn.execute('DELETE FROM staged_videos WHERE user_id = ?', (str(user_id),))
+            conn.execute('DELETE FROM checkpoints WHERE user_id = ?', (str(user_id),))
+        self._notify_write(user_id)
+
+    def migrate_csvs(self, data_dir='data'):
+        """Import every data/{user_id}.csv; safe to run again since (user_id, bvid) is the key"""
+        imported = 0
+        for csv_file in sorted(glob.glob(os.path.join(data_dir, '*.csv'))):
+            user_id = os.path.splitext(os.path.basename(csv_file))[0]
+            if not user_id.isdigit():
+                continue
+            df = pd.read_csv(csv_file, dtype=str).fillna('')
+            for column in VIDEO_COLUMNS:
+                if column not in df.columns:
+                    df[column] = ''
+            videos = df[VIDEO_COLUMNS].drop_duplicates(subset=['bvid'], keep='first').to_dict('records')
+            self.upsert_videos(user_id, videos)
+            imported += len(videos)
+            print(f"Migrated {len(videos)} videos for user {user_id} from {csv_file}")
+        return imported
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=DB_PATH):
+    """Shared VideoStore for a database path; the first open imports any old CSVs"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            is_new = not os.path.exists(path)
+            store = VideoStore(path)
+            if is_new:
+                store.migrate_csvs(os.path.dirname(path) or '.')
+            _stores[key] = store
+        return _stores[key]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Video store maintenance")
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = sub.add_parser('migrate', help="import data/{user_id}.csv files into the SQLite store")
+    migrate_parser.add_argument('--data-dir', default='data')
+    migrate_parser.add_argument('--db', default=DB_PATH)
+    backfill_parser = sub.add_parser('backfill', help="compute pub_ts/play_count_int for rows that lack them")
+    backfill_parser.add_argument('--db', default=DB_PATH)
+    reindex_parser = sub.add_parser('reindex', help="rebuild the title search index")
+    reindex_parser.add_argument('--db', default=DB_PATH)
+    checkpoints_parser = sub.add_parser('checkpoints', help="list unfinished crawls, or drop them with --discard")
+    checkpoints_parser.add_argument('--discard', nargs='*', metavar='USER_ID',
+                                    help="start these users' crawls over (all of them if none are given)")
+    checkpoints_parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'checkpoints':
+        store = VideoStore(args.db)
+        checkpoints = store.checkpoints()
+        if args.discard is not None:
+            for user_id in args.discard or list(checkpoints):
+                store.discard_staged(user_id)
+                print(f"Discarded the checkpoint for {user_id}")
+        else:
+            for user_id, checkpoint in sorted(checkpoints.items()):
+                print(f"{user_id}: page {checkpoint['last_page']}/{checkpoint['total_pages'] or '?'}, "
+                      f"{checkpoint['staged']} videos staged, last {checkpoint['last_bvid']} at {checkpoint['updated_at']}")
+            if not checkpoints:
+                print("No unfinished crawls")
+    elif args.command == 'reindex':
+        VideoStore(args.db).rebuild_search_index()
+    elif args.command == 'backfill':
+        count = VideoStore(args.db).backfill_normalized()
+        print(f"Backfilled {count} videos in {args.db}")
+    elif args.command == 'migrate':
+        count = VideoStore(args.db).migrate_csvs(args.data_dir)
+        print(f"Migrated {count} videos into {args.db}")
@@ -0,0 +1,194 @@
+"""Local stand-in for the bilibili API, for developing and benchmarking offline.
+
+Serves the endpoints HttpBackend uses. Video-list pages are replayed from
+recorded responses (`arc_search_{mid}_{pn}.json` in the fixtures directory)
+and, when `synthetic_videos` is set, generated for any other mid. Requests
+are checked for a valid WBI signature and the buvid3 cookie so signing and
+cookie handling are exercised too.
+
+    python -m bili_spider.stub_server record 927587 --out fixtures/api
+    python -m bili_spider.stub_server serve --fixtures fixtures/api --port 8800
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from .fetch import HttpBackend, sign_wbi
+
+# Fake key material; 32 hex chars each like the real ones
+STUB_IMG_KEY = '7cd084941338484aae1ad9425b84077c'
+STUB_SUB_KEY = '4932caff0ff746eab6f01bf08b70ac45'
+
+SYNTHETIC_TITLES = ['【公开课】线性代数 第{}讲', '机器学习入门 Lecture {}', '数据结构与算法 #{}', '深度学习导论（{}）']
+
+
+def synthetic_vlist(mid, count, now=None):
+    """Deterministic fake uploads for a mid, newest first, one every 12 hours"""
+    now = int(now or 1760000000)
+    return [
+        {
+            'bvid': f"BV1S{int(mid) % 1000:03d}{i:05d}",
+            'title': SYNTHETIC_TITLES[i % len(SYNTHETIC_TITLES)].format(count - i),
+            'author': f"User_{mid}",
+            'play': (int(mid) * 7919 + i * 104729) % 2000000,
+            'created': now - i * 43200,
+            'length': f"{10 + i % 50:02d}:{i % 60:02d}",
+        }
+        for i in range(count)
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'BiliStub/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, cookies=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for cookie in cookies or []:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = dict(parse_qsl(parsed.query, keep_blank_values=True))
+        self.server.hits[parsed.path] = self.server.hits.get(parsed.path, 0) + 1
+
+        if parsed.path == '/x/frontend/finger/spi':
+            self._send_json({'code': 0, 'data': {'b_3': 'stub-buvid3', 'b_4': 'stub-buvid4'}},
+                            cookies=['buvid3=stub-buvid3; Path=/', 'buvid4=stub-buvid4; Path=/'])
+        elif parsed.path == '/x/web-interface/nav':
+            self._send_json({'code': -101, 'message': '账号未登录', 'data': {'isLogin': False, 'wbi_img': {
+                'img_url': f'https://i0.hdslb.com/bfs/wbi/{STUB_IMG_KEY}.png',
+                'sub_url': f'https://i0.hdslb.com/bfs/wbi/{STUB_SUB_KEY}.png',
+            }}})
+        elif parsed.path == '/x/space/wbi/arc/search':
+            self._send_json(self.server.arc_search(params, self.headers.get('Cookie', '')))
+        elif parsed.path == '/x/web-interface/card':
+            mid = params.get('mid', '0')
+            self._send_json({'code': 0, 'data': {'card': {'mid': mid, 'name': f"User_{mid}"}}})
+        else:
+            self._send_json({'code': -404, 'message': '啥都木有'}, status=404)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, fixtures_dir=None, synthetic_videos=None, latency=0.0, check_signature=True):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.fixtures_dir = fixtures_dir
+        self.synthetic_videos = synthetic_videos
+        self.latency = latency
+        self.check_signature = check_signature
+        self.hits = {}
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def _signature_ok(self, params):
+        received = params.get('w_rid')
+        unsigned = {k: v for k, v in params.items() if k not in ('w_rid', 'wts')}
+        expected = sign_wbi(unsigned, STUB_IMG_KEY, STUB_SUB_KEY, wts=params.get('wts', 0))['w_rid']
+        return received == expected
+
+    def arc_search(self, params, cookie_header):
+        if self.check_signature and (not self._signature_ok(params) or 'buvid3=' not in cookie_header):
+            return {'code': -352, 'message': '风控校验失败'}
+
+        mid = params.get('mid', '0')
+        pn = int(params.get('pn', 1))
+        ps = int(params.get('ps', 30))
+
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, f"arc_search_{mid}_{pn}.json")
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+
+        if self.synthetic_videos is None:
+            return {'code': -404, 'message': '啥都木有'}
+
+        vlist = synthetic_vlist(mid, self.synthetic_videos)
+        return {'code': 0, 'message': '0', 'data': {
+            'list': {'vlist': vlist[(pn - 1) * ps:pn * ps]},
+            'page': {'pn': pn, 'ps': ps, 'count': len(vlist)},
+        }}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def record(mid, out_dir, max_pages=None, base_url=None):
+    """Save live arc/search responses for a mid so the stub server can replay them"""
+    os.makedirs(out_dir, exist_ok=True)
+    backend = HttpBackend(base_url=base_url) if base_url else HttpBackend()
+    pn = 1
+    while True:
+        data = backend.fetch_page(mid, pn)
+        path = os.path.join(out_dir, f"arc_search_{mid}_{pn}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'code': 0, 'message': '0', 'data': data}, f, ensure_ascii=False, indent=2)
+        print(f"Saved {path}")
+
+        page = data.get('page') or {}
+        if pn * page.get('ps', backend.page_size) >= page.get('count', 0):
+            break
+        if max_pages and pn >= max_pages:
+            break
+        pn += 1
+        time.sleep(1)
+    backend.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help="run the stub API server")
+    serve_parser.add_argument('--port', type=int, default=8800)
+    serve_parser.add_argument('--fixtures', help="directory of recorded responses")
+    serve_parser.add_argument('--synthetic-videos', type=int, help="generate this many videos for unrecorded mids")
+    serve_parser.add_argument('--latency', type=float, default=0.0, help="seconds to delay each response")
+
+    record_parser = sub.add_parser('record', help="record live responses for a user")
+    record_parser.add_argument('mid', type=int)
+    record_parser.add_argument('--out', required=True)
+    record_parser.add_argument('--max-pages', type=int)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        server = StubServer(port=args.port, fixtures_dir=args.fixtures,
+                            synthetic_videos=args.synthetic_videos, latency=args.latency)
+        print(f"Stub API listening on {server.base_url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    else:
+        record(args.mid, args.out, max_pages=args.max_pages)
@@ -0,0 +1,71 @@
+"""Everything from every followed user, newest first.
+
+Each user's videos are read through a keyset cursor on the
+(user_id, pub_ts) index and the per-user streams are merged lazily with
+heapq.merge. A stream starts with a small batch and doubles it as the
+merge keeps drawing from it, so a page of the feed costs one small query
+per user plus at most about twice the rows the page shows, however many
+videos are stored. Videos whose publish time could not be normalized
+(pub_ts NULL) are left out.
+"""
+import heapq
+import json
+import os
+from datetime import datetime
+from itertools import islice
+
+from .normalize import TS_FORMAT
+
+STATE_PATH = 'data/timeline.json'
+# Rows in each user's first query; most users contribute a few videos to a page, if any
+FIRST_BATCH = 8
+
+
+def iter_user_feed(store, user_id, since=None, before=None, batch_size=50):
+    """One user's videos ordered by (pub_ts, rowid) descending, fetched `batch_size` rows at a time"""
+    cursor = before
+    while True:
+        videos = store.videos_by_pub_ts(user_id, batch_size, since=since, before=cursor)
+        yield from videos
+        if len(videos) < batch_size:
+            return
+        cursor = feed_key(videos[-1])
+        # Users deep into the merge are read in bigger steps
+        batch_size = min(batch_size * 2, 1000)
+
+
+def feed_key(video):
+    return (video['pub_ts'], video['rowid'])
+
+
+def merged_feed(store, user_ids=None, since=None, before=None, batch_size=50):
+    """Lazy k-way merge of every user's feed; `before` is the feed_key of the last video already shown"""
+    if user_ids is None:
+        user_ids = list(store.manifest())
+    streams = [iter_user_feed(store, user_id, since=since, before=before, batch_size=batch_size)
+               for user_id in user_ids]
+    return heapq.merge(*streams, key=feed_key, reverse=True)
+
+
+def timeline_page(store, limit=50, user_ids=None, since=None, before=None):
+    """(videos, next_before): one page of the merged feed and the cursor for the page after it"""
+    # Streams start small and grow only for the users the page actually draws on
+    videos = list(islice(merged_feed(store, user_ids, since, before, batch_size=min(limit, FIRST_BATCH)), limit))
+    next_before = feed_key(videos[-1]) if len(videos) == limit else None
+    return videos, next_before
+
+
+def read_last_visit(path=STATE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('last_visit')
+
+
+def mark_visit(path=STATE_PATH, now=None):
+    """Record this visit and return the previous one, for "since last visit" filtering"""
+    previous = read_last_visit(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'last_visit': (now or datetime.now()).strftime(TS_FORMAT)}, f)
+    return previous
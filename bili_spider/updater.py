@@ -1,77 +1,429 @@
 import os
-import pandas as pd
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
 from datetime import datetime
-import json
-from .spider import make_chrome_browser, get_user_videos
+from . import metrics
+from .fetch import FetchError, HttpBackend, SeleniumBackend
+from .following import FOLLOWING_PATH, following_lock, read_following, save_last_updated, write_following
+from .ratelimit import RateLimiter
+from .spider import BrowserPool, CrawlIncomplete, ResumeMismatch, TabbedBrowser
+from .store import get_store
+from .watermark import HighWaterMark
 
 
-def update_user_videos(user_id, user_name, chromedriver_path=None, progress_callback=None):
-    csv_file = f"data/{user_id}.csv"
-    existing_bvids = set()
-    
-    if os.path.exists(csv_file):
-        df_existing = pd.read_csv(csv_file)
-        existing_bvids = set(df_existing['bvid'].tolist())
+def _iter_user_videos(user_id, chromedriver_path, progress_callback, pool, rate_limiter, backend, high_water_mark=None,
+                      parallel_pages=1, cache=None, start_page=1):
+    # The HTTP backend is tried first when given; Chrome stays as the fallback
+    # for when the API refuses us before anything has been read.
+    if backend is not None and backend.name != 'selenium':
+        yielded = False
+        try:
+            for video_data in backend.iter_videos(user_id, progress_callback=progress_callback,
+                                                  high_water_mark=high_water_mark, start_page=start_page):
+                yielded = True
+                yield video_data
+            return
+        except FetchError as e:
+            if yielded:
+                raise
+            print(f"{backend.name} backend failed for {user_id} ({e}), falling back to Chrome")
+
+    if backend is not None and backend.name == 'selenium':
+        selenium_backend = backend
+    else:
+        selenium_backend = SeleniumBackend(pool=pool, executable_path=chromedriver_path, rate_limiter=rate_limiter,
+                                           parallel_pages=parallel_pages, cache=cache)
+    yield from selenium_backend.iter_videos(user_id, progress_callback=progress_callback,
+                                            high_water_mark=high_water_mark, start_page=start_page)
+
+
+def load_existing_bvids(user_id, user_name):
+    with metrics.span('load_existing'):
+        existing_bvids = get_store().existing_bvids(user_id)
+    if existing_bvids:
         print(f"Found {len(existing_bvids)} existing videos for {user_name}")
-    
-    new_videos = []
-    duplicate_count = 0
-    consecutive_duplicates = 0
-    
-    with make_chrome_browser(executable_path=chromedriver_path, headless=True) as browser:
-        # Don't limit pages - get all videos
-        for video_data in get_user_videos(browser, int(user_id), progress_callback=progress_callback):
-            url, bvid, _, title, play_count, pub_date, duration = video_data
-            
-            if bvid in existing_bvids:
-                duplicate_count += 1
-                consecutive_duplicates += 1
-                
-                if consecutive_duplicates >= 10:
-                    print(f"Found 10 consecutive duplicates, stopping early")
-                    break
-            else:
-                consecutive_duplicates = 0
-                new_videos.append({
-                    'url': url,
-                    'bvid': bvid,
-                    'user_name': user_name,
-                    'title': title,
-                    'play_count': play_count,
-                    'pub_date': pub_date,
-                    'duration': duration,
-                    'fetched_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                })
-    
-    if new_videos:
-        df_new = pd.DataFrame(new_videos)
-        
-        if os.path.exists(csv_file):
-            df_existing = pd.read_csv(csv_file)
-            df_combined = pd.concat([df_new, df_existing], ignore_index=True)
-            
-            df_combined = df_combined.drop_duplicates(subset=['bvid'], keep='first')
+    return existing_bvids
+
+
+def load_high_water_mark(user_id):
+    """The newest stored video for a user, or None when nothing is stored yet (a full crawl)"""
+    return HighWaterMark.from_manifest(get_store().manifest_entry(user_id))
+
+
+class NewVideoCollector:
+    """Collects unseen videos from a newest-first stream and decides when to stop.
+
+    Shared by the sync updater and the async crawler so both apply the same
+    duplicate rules and build the same rows.
+    """
+
+    def __init__(self, user_name, existing_bvids, max_consecutive_duplicates=10):
+        self.user_name = user_name
+        self.existing_bvids = existing_bvids
+        self.max_consecutive_duplicates = max_consecutive_duplicates
+        self.new_videos = []
+        self.duplicate_count = 0
+        self.consecutive_duplicates = 0
+
+    def add(self, video_data):
+        """Record one video; returns False once the caller should stop reading"""
+        url, bvid, _, title, play_count, pub_date, duration = video_data
+
+        if bvid in self.existing_bvids:
+            metrics.count('duplicates')
+            self.duplicate_count += 1
+            self.consecutive_duplicates += 1
+
+            if self.consecutive_duplicates >= self.max_consecutive_duplicates:
+                print(f"Found {self.max_consecutive_duplicates} consecutive duplicates, stopping early")
+                return False
         else:
-            df_combined = df_new
-        
-        df_combined.to_csv(csv_file, index=False, encoding='utf-8')
-        print(f"Added {len(new_videos)} new videos for {user_name}")
+            self.consecutive_duplicates = 0
+            self.new_videos.append({
+                'url': url,
+                'bvid': bvid,
+                'user_name': self.user_name,
+                'title': title,
+                'play_count': play_count,
+                'pub_date': pub_date,
+                'duration': duration,
+                'fetched_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+        return True
+
+
+def mark_user_updated(user_id, path=FOLLOWING_PATH):
+    """Stamp last_updated for one user in following.json, for processes other than the app.
+
+    The file is re-read under the cross-process lock (see following.py) so
+    users added in the app meanwhile aren't written away. Returns the
+    following dict as written, or None if the user is no longer followed.
+    """
+    with following_lock(path):
+        if not os.path.exists(path):
+            return None
+        following = read_following(path)
+        if user_id not in following:
+            return None
+        following[user_id]['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        write_following(following, path)
+        return following
+
+
+def update_user_videos(user_id, user_name, chromedriver_path=None, progress_callback=None, pool=None, rate_limiter=None, backend=None,
+                       parallel_pages=1, cache=None):
+    """Crawl one user's new videos into the store; returns how many were added.
+
+    Videos are staged in the store as each page completes, together with a
+    checkpoint (last page, last bvid, total pages), so only the collector's
+    current page is held in memory. If the crawl dies or is cut off before
+    its last page, the next call for this user resumes from the checkpoint,
+    or starts over if the site no longer lines up with it. The staged
+    videos join the user's stored ones when the crawl finishes.
+    """
+    store = get_store()
+    crawl_args = (user_id, user_name, chromedriver_path, progress_callback, pool, rate_limiter, backend,
+                  parallel_pages, cache)
+    checkpoint = store.checkpoint(user_id)
+    if checkpoint is not None:
+        try:
+            return _crawl_staged(*crawl_args, checkpoint=checkpoint)
+        except ResumeMismatch as e:
+            print(f"Can't resume {user_name} ({e}), starting over")
+            store.discard_staged(user_id)
+    return _crawl_staged(*crawl_args)
+
+
+class StagedCrawl:
+    """One user's crawl, staged in the store page by page behind a checkpoint.
+
+    Shared by update_user_videos and the async crawler. Start reading at
+    `start_page`, call page_started() as each page begins and add() for
+    each video in order, then finish() to merge the staged videos into the
+    store. When the crawl stops between pages (a page that didn't load, a
+    failed request), cut_short() keeps the pages read in full for the next
+    run. With a `checkpoint`, the run resumes it: the last completed page is
+    read again, and its last video has to turn up there, or on the next
+    page if new uploads pushed it along, which shows nothing between it and
+    the first unread video was skipped. Otherwise ResumeMismatch is raised.
+    """
+
+    def __init__(self, user_id, user_name, checkpoint=None):
+        self.store = get_store()
+        self.user_id = user_id
+        self.user_name = user_name
+        existing_bvids = load_existing_bvids(user_id, user_name)
+        self.start_page = 1
+        self.resume_bvid = None
+        self.total_pages = None
+        if checkpoint is not None:
+            existing_bvids |= self.store.staged_bvids(user_id)
+            self.resume_bvid = checkpoint['last_bvid']
+            self.start_page = checkpoint['last_page'] if self.resume_bvid else checkpoint['last_page'] + 1
+            self.total_pages = checkpoint['total_pages']
+            print(f"Resuming {user_name} at page {self.start_page}/{self.total_pages or '?'} "
+                  f"({checkpoint['staged']} videos staged, last {self.resume_bvid})")
+        self.collector = NewVideoCollector(user_name, existing_bvids)
+        self.page = self.start_page
+        self.last_bvid = None
+        self.read = False
+
+    def _stage(self, last_page):
+        # Until the checkpoint's video turns up, the old checkpoint stays as it is
+        if self.resume_bvid is not None:
+            return
+        with metrics.span('store_merge'):
+            self.store.stage_videos(self.user_id, self.collector.new_videos, last_page, self.last_bvid,
+                                    self.total_pages)
+        self.collector.new_videos = []
+
+    def page_started(self, current_page, total_pages):
+        if self.resume_bvid is not None and current_page > self.start_page + 1:
+            raise ResumeMismatch(f"{self.resume_bvid} is no longer on page {self.start_page} or {self.start_page + 1}")
+        # A new page starting means everything before it is complete
+        if current_page != self.page:
+            self._stage(current_page - 1)
+            self.page = current_page
+        self.read = True
+        if total_pages:
+            self.total_pages = total_pages
+
+    def add(self, video_data):
+        """Take the next video; returns False once the caller should stop reading"""
+        self.last_bvid = video_data[1]
+        if self.resume_bvid is not None:
+            # Read by the earlier run, up to and including its last video
+            if video_data[1] == self.resume_bvid:
+                self.resume_bvid = None
+            return True
+        return self.collector.add(video_data)
+
+    def cut_short(self):
+        """Keep the pages read so far, up to the one in progress, for the next run"""
+        if self.read:
+            self._stage(self.page)
+
+    def finish(self):
+        """Merge the staged videos into the store and drop the checkpoint; returns how many were added"""
+        if self.resume_bvid is not None:
+            raise ResumeMismatch(f"{self.resume_bvid} is no longer listed")
+        if self.collector.new_videos:
+            self._stage(self.page)
+        with metrics.span('store_merge'):
+            new_count = self.store.commit_staged(self.user_id)
+        if new_count:
+            metrics.count('new_videos', new_count)
+            print(f"Added {new_count} new videos for {self.user_name}")
+        else:
+            print(f"No new videos found for {self.user_name}")
+        return new_count
+
+
+def _crawl_staged(user_id, user_name, chromedriver_path, progress_callback, pool, rate_limiter, backend,
+                  parallel_pages, cache, checkpoint=None):
+    crawl = StagedCrawl(user_id, user_name, checkpoint)
+
+    def on_page(current_page, total_pages, message):
+        crawl.page_started(current_page, total_pages)
+        if progress_callback:
+            progress_callback(current_page, total_pages, message)
+
+    # The generator stops by itself at the newest stored video; the duplicate
+    # count in the collector stays as a backstop
+    videos = _iter_user_videos(user_id, chromedriver_path, on_page, pool, rate_limiter, backend,
+                               high_water_mark=load_high_water_mark(user_id), parallel_pages=parallel_pages,
+                               cache=cache, start_page=crawl.start_page)
+    try:
+        with closing(videos):
+            # Don't limit pages - get all videos
+            for video_data in videos:
+                if not crawl.add(video_data):
+                    break
+    except CrawlIncomplete:
+        # Raised between pages, so the one in progress was read in full
+        crawl.cut_short()
+        raise
+    return crawl.finish()
+
+
+def _update_one(user_id, user_info, chromedriver_path, pool, rate_limiter, backend=None, progress_callback=None,
+                parallel_pages=1, cache=None):
+    pages = [0]
+
+    def track_pages(current_page, total_pages, message):
+        pages[0] = max(pages[0], current_page)
+        if progress_callback:
+            progress_callback(current_page, total_pages, message)
+
+    result = {'user_id': user_id, 'name': user_info['name'], 'new_count': 0, 'pages': 0, 'seconds': 0.0,
+              'error': None, 'skipped': False}
+    started = time.perf_counter()
+    try:
+        result['new_count'] = update_user_videos(user_id, user_info['name'], chromedriver_path,
+                                                 progress_callback=track_pages, pool=pool,
+                                                 rate_limiter=rate_limiter, backend=backend,
+                                                 parallel_pages=parallel_pages, cache=cache)
+    except Exception as e:
+        metrics.count('user_errors')
+        result['error'] = str(e)
+    metrics.count('users_crawled')
+    result['pages'] = pages[0]
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def probe_user(backend, user_id):
+    """True if the user's newest listed video isn't the newest one stored, from a single ps=1 list request"""
+    entry = get_store().manifest_entry(user_id)
+    if entry is None or get_store().checkpoint(user_id) is not None:
+        return True
+    data = backend.fetch_page(user_id, 1, page_size=1, fresh=True)
+    vlist = (data.get('list') or {}).get('vlist') or []
+    if not vlist:
+        return False
+    return vlist[0].get('bvid') != entry['newest_bvid']
+
+
+def probe_changes(user_ids, backend, workers=8):
+    """The users worth crawling, probed `workers` at a time; a failed probe counts as changed"""
+    changed = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(probe_user, backend, user_id): user_id for user_id in user_ids}
+        for future in as_completed(futures):
+            user_id = futures[future]
+            try:
+                if future.result():
+                    changed.add(user_id)
+            except FetchError as e:
+                print(f"Probe failed for {user_id} ({e}), will crawl")
+                changed.add(user_id)
+    print(f"Probed {len(futures)} users: {len(changed)} changed, {len(futures) - len(changed)} crawls avoided")
+    return changed
+
+
+def summarize_results(results, elapsed, rate_limit_wait_seconds=0.0):
+    minutes = elapsed / 60 if elapsed > 0 else 1
+    total_pages = sum(r['pages'] for r in results)
+    summary = {
+        'results': results,
+        'users': len(results),
+        'failed': sum(1 for r in results if r['error']),
+        'skipped': sum(1 for r in results if r.get('skipped')),
+        'new_videos': sum(r['new_count'] for r in results),
+        'pages': total_pages,
+        'seconds': elapsed,
+        'users_per_min': len(results) / minutes,
+        'pages_per_min': total_pages / minutes,
+        'rate_limit_wait_seconds': rate_limit_wait_seconds,
+    }
+    print(f"Updated {summary['users']} users ({summary['failed']} failed, {summary['skipped']} unchanged) in {elapsed:.0f}s: "
+          f"{summary['users_per_min']:.1f} users/min, {summary['pages_per_min']:.1f} pages/min")
+    return summary
+
+
+def update_all_users(following_users, chromedriver_path=None, workers=1, requests_per_minute=20, on_result=None, backend='selenium',
+                     probe=True, probe_workers=8, probe_rpm=60, lean=False, parallel_pages=1, tabs=False,
+                     cache=None):
+    """Update every followed user, `workers` at a time, each with its own browser.
+
+    All workers share one RateLimiter so the total request rate to bilibili
+    stays under `requests_per_minute` however many workers run. `on_result`
+    is called from the calling thread as each user finishes. With
+    backend='http' (or an HttpBackend instance) users are read from the JSON
+    API and Chrome is only started for users the API refuses. With `probe`,
+    every user is first checked with one small API request (`probe_workers`
+    at a time, at most `probe_rpm` per minute) and users whose newest video
+    is already stored are not crawled. `lean` starts Chrome without images,
+    fonts or media (see spider.launch_chrome). With `parallel_pages` > 1,
+    users crawled in full through Chrome have their pages opened by URL in
+    that many sessions at once; the pool grows to match. With `tabs`, those
+    sessions are tabs of a single Chrome (see spider.TabbedBrowser) rather
+    than separate browsers. `cache` (a replay.ResponseCache) records every
+    page read, or in replay mode serves the whole run from disk with no
+    probe stage. Returns a summary with per-user results and aggregate
+    throughput.
+    """
+    rate_limiter = RateLimiter(rate_per_minute=requests_per_minute)
+    save_lock = threading.Lock()
+    results = []
+    started = time.perf_counter()
+
+    if not isinstance(backend, str):
+        http_backend = backend
+    elif backend == 'http':
+        http_backend = HttpBackend(rate_limiter=rate_limiter, maxsize=workers, cache=cache)
     else:
-        print(f"No new videos found for {user_name}")
-    
-    return len(new_videos)
+        http_backend = None
 
+    def save_following():
+        with save_lock:
+            save_last_updated(following_users)
 
-def update_all_users(following_users, chromedriver_path=None):
-    for user_id, user_info in following_users.items():
-        print(f"\nUpdating videos for {user_info['name']} (ID: {user_id})")
+    to_crawl = following_users
+    if cache is not None and cache.mode == 'replay':
+        # A probe can't tell anything new from a recording
+        probe = False
+    if probe and following_users:
+        if isinstance(backend, str):
+            probe_backend = HttpBackend(rate_limiter=RateLimiter(rate_per_minute=probe_rpm, burst=probe_workers),
+                                        maxsize=probe_workers, cache=cache)
+        else:
+            probe_backend = http_backend
         try:
-            new_count = update_user_videos(user_id, user_info['name'], chromedriver_path)
-            
-            user_info['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            with open('data/following.json', 'w', encoding='utf-8') as f:
-                json.dump(following_users, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            print(f"Error updating {user_info['name']}: {e}")
\ No newline at end of file
+            changed = probe_changes(list(following_users), probe_backend, workers=probe_workers)
+        finally:
+            if probe_backend is not http_backend:
+                probe_backend.close()
+
+        to_crawl = {user_id: info for user_id, info in following_users.items() if user_id in changed}
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for user_id, user_info in following_users.items():
+            if user_id in changed:
+                continue
+            user_info['last_updated'] = now
+            result = {'user_id': user_id, 'name': user_info['name'], 'new_count': 0, 'pages': 0, 'seconds': 0.0,
+                      'error': None, 'skipped': True}
+            metrics.count('users_skipped')
+            results.append(result)
+            if on_result:
+                on_result(result)
+        if len(to_crawl) < len(following_users):
+            save_following()
+
+    if tabs:
+        pool = TabbedBrowser(tabs=workers * parallel_pages, executable_path=chromedriver_path, lean=lean)
+    else:
+        pool = BrowserPool(size=workers * parallel_pages, executable_path=chromedriver_path, lean=lean)
+    with pool:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for user_id, user_info in to_crawl.items():
+                print(f"Queued update for {user_info['name']} (ID: {user_id})")
+                future = executor.submit(_update_one, user_id, user_info, chromedriver_path, pool, rate_limiter, http_backend,
+                                         parallel_pages=parallel_pages, cache=cache)
+                futures[future] = user_info
+
+            for future in as_completed(futures):
+                user_info = futures[future]
+                result = future.result()
+                results.append(result)
+
+                if result['error']:
+                    print(f"Error updating {user_info['name']}: {result['error']}")
+                else:
+                    user_info['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    save_following()
+
+                if on_result:
+                    on_result(result)
+
+        stats = pool.stats()
+        print(f"Browser pool: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['startups']} startups ({stats['avg_startup_seconds']:.1f}s avg)")
+
+    if http_backend and isinstance(backend, str):
+        http_backend.close()
+
+    return summarize_results(results, time.perf_counter() - started, rate_limiter.waited_seconds)
@@ -0,0 +1,116 @@
+import random
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from . import metrics
+
+CARD_SELECTOR = ".bili-video-card, .small-item, .video-item, [class*='video-card'], [class*='video-item']"
+
+# Classifies the space page in one round trip: cards rendered, empty space,
+# anti-bot block, or still loading (null)
+PAGE_STATE_JS = '''
+    if (document.querySelector(arguments[0])) return 'cards';
+    var text = document.body ? document.body.innerText : '';
+    if (text.indexOf('还没有投稿视频') >= 0 || text.indexOf('没有更多数据') >= 0) return 'empty';
+    var html = document.documentElement.innerHTML;
+    if (text.indexOf('错误码') >= 0 || text.indexOf('-352') >= 0 || html.indexOf('UPINFO_ERROR') >= 0) return 'blocked';
+    return null;
+'''
+
+# What identifies the page currently shown: the active page button and the first card's bvid
+PAGE_SIGNATURE_JS = '''
+    var active = document.querySelector(
+        '.vui_pagenation--btn-num.vui_button--active, .be-pager-item-active, [class*="page"] [class*="active"]');
+    var link = document.querySelector(arguments[0] + ' a[href*="/video/"]');
+    var bvid = null;
+    if (link) {
+        var m = link.getAttribute('href').match(/BV[0-9A-Za-z]+/);
+        bvid = m ? m[0] : null;
+    }
+    return [active ? active.textContent.trim() : null, bvid];
+'''
+
+
+class PacingPolicy:
+    """Politeness delays, kept apart from waiting for the page to be ready.
+
+    The delay between pages is `between_pages` seconds plus up to `jitter`
+    seconds at random. PacingPolicy.none() disables pacing, e.g. for replays.
+    """
+
+    def __init__(self, between_pages=1.0, jitter=1.0):
+        self.between_pages = between_pages
+        self.jitter = jitter
+
+    @classmethod
+    def none(cls):
+        return cls(between_pages=0, jitter=0)
+
+    def delay(self):
+        return self.between_pages + random.random() * self.jitter
+
+    def pace(self, wait_stats=None):
+        seconds = self.delay()
+        if seconds > 0:
+            time.sleep(seconds)
+        if wait_stats is not None:
+            wait_stats.record('pacing', seconds)
+        return seconds
+
+
+class WaitStats:
+    """Records how long each kind of wait took so slow runs can be explained"""
+
+    def __init__(self):
+        self.waits = {}
+
+    def record(self, name, seconds):
+        self.waits.setdefault(name, []).append(seconds)
+        metrics.observe('wait_seconds', name, seconds)
+
+    def summary(self):
+        return {
+            name: {'count': len(values), 'total': sum(values), 'mean': sum(values) / len(values), 'max': max(values)}
+            for name, values in self.waits.items()
+        }
+
+    def format(self):
+        parts = [f"{name} {s['total']:.1f}s ({s['count']}x, avg {s['mean']:.2f}s, max {s['max']:.2f}s)"
+                 for name, s in sorted(self.summary().items())]
+        return ', '.join(parts) if parts else 'no waits'
+
+
+def _timed_wait(browser, name, condition, timeout, wait_stats, poll_frequency=0.1):
+    started = time.perf_counter()
+    try:
+        return WebDriverWait(browser, timeout, poll_frequency=poll_frequency).until(condition)
+    except TimeoutException:
+        return None
+    finally:
+        if wait_stats is not None:
+            wait_stats.record(name, time.perf_counter() - started)
+
+
+def wait_for_page_state(browser, timeout=15, wait_stats=None):
+    """Wait until the space page shows cards, an empty notice or a block; None on timeout"""
+    return _timed_wait(browser, 'page_load',
+                       lambda driver: driver.execute_script(PAGE_STATE_JS, CARD_SELECTOR),
+                       timeout, wait_stats)
+
+
+def page_signature(browser):
+    try:
+        return tuple(browser.execute_script(PAGE_SIGNATURE_JS, CARD_SELECTOR))
+    except Exception:
+        return (None, None)
+
+
+def wait_for_page_change(browser, before, timeout=10, wait_stats=None):
+    """Wait until the active page number or the first card's bvid differs from `before`"""
+    def changed(driver):
+        after = page_signature(driver)
+        return after if after != before and after[1] else False
+
+    return _timed_wait(browser, 'page_change', changed, timeout, wait_stats)
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from .normalize import TS_FORMAT, normalize_pub_dates
+
+
+class HighWaterMark:
+    """The newest video already stored for a user, as read from the manifest.
+
+    A newest-first listing has nothing new left once it reaches that bvid,
+    or any video published on an earlier day (for when the stored video
+    has since been deleted). Days rather than timestamps are compared
+    because the page gives "3小时前" for some videos and bare dates for
+    others.
+    """
+
+    def __init__(self, bvid, pub_ts=None):
+        self.bvid = bvid
+        # Rows stored before pub_ts existed may carry a raw "03-15" here instead
+        self.pub_day = pub_ts[:10] if pub_ts and len(pub_ts) >= 10 and pub_ts[4] == '-' else None
+
+    @classmethod
+    def from_manifest(cls, entry):
+        if not entry or not entry.get('newest_bvid'):
+            return None
+        return cls(entry['newest_bvid'], entry.get('newest_pub_date'))
+
+    def reached(self, video):
+        """True once `video` (a get_user_videos tuple) is the mark or older than it"""
+        if video[1] == self.bvid:
+            return True
+        if self.pub_day is None:
+            return False
+        pub_ts = normalize_pub_dates([video[5]], [datetime.now().strftime(TS_FORMAT)])[0]
+        return pub_ts is not None and pub_ts[:10] < self.pub_day
+
+    def __repr__(self):
+        return f"HighWaterMark({self.bvid!r}, {self.pub_day!r})"
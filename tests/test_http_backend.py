@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from benchmarks.fakes import FakePool, FakeSite
+from bili_spider.fetch import FetchError, HttpBackend
+from bili_spider.replay import ResponseCache
+from bili_spider.stub_server import StubServer, synthetic_vlist
+from bili_spider.updater import _iter_user_videos
+from bili_spider.waits import PacingPolicy
+from bili_spider.watermark import HighWaterMark
+
+
+@pytest.fixture
+def server():
+    with StubServer(synthetic_videos=75) as server:
+        yield server
+
+
+@pytest.fixture
+def backend(server):
+    backend = HttpBackend(base_url=server.base_url, pacing=PacingPolicy.none())
+    yield backend
+    backend.close()
+
+
+def test_iter_videos_reads_every_page_in_order(server, backend):
+    pages = []
+    videos = list(backend.iter_videos(2000, progress_callback=lambda page, total, message: pages.append((page, total))))
+
+    assert [video[1] for video in videos] == [item['bvid'] for item in synthetic_vlist(2000, 75)]
+    assert pages == [(1, 3), (2, 3), (3, 3)]
+    assert server.hits['/x/space/wbi/arc/search'] == 3
+
+
+def test_requests_are_signed_and_carry_buvid(server, backend):
+    # The stub answers -352 unless w_rid matches its keys and buvid3 is sent
+    backend.fetch_page(2000, 1)
+
+    assert backend.cookies['buvid3'] == 'stub-buvid3'
+    assert server.hits['/x/web-interface/nav'] == 1
+
+
+def test_bad_signature_raises_fetch_error(backend):
+    backend._wbi_keys = ('0' * 32, '1' * 32)
+    backend._wbi_keys_at = time.time()
+
+    with pytest.raises(FetchError) as excinfo:
+        backend.fetch_page(2000, 1)
+    assert excinfo.value.code == -352
+
+
+def test_error_code_raises_fetch_error():
+    with StubServer() as server:
+        backend = HttpBackend(base_url=server.base_url, pacing=PacingPolicy.none())
+        try:
+            with pytest.raises(FetchError) as excinfo:
+                list(backend.iter_videos(2000))
+        finally:
+            backend.close()
+    assert excinfo.value.code == -404
+
+
+def test_refused_http_crawl_falls_back_to_chrome(server, backend):
+    backend._wbi_keys = ('0' * 32, '1' * 32)
+    backend._wbi_keys_at = time.time()
+    site = FakeSite(2000, 2)
+    leased = []
+
+    class CountingPool(FakePool):
+        def lease(self):
+            leased.append(1)
+            return super().lease()
+
+    videos = list(_iter_user_videos('2000', None, lambda *args: None, CountingPool([site]), None, backend))
+
+    assert server.hits['/x/space/wbi/arc/search'] == 1
+    assert leased == [1]
+    assert len(videos) == 2 * site.per_page
+
+
+def test_recording_serves_full_crawls_but_not_probes_or_incremental_pages(server, tmp_path):
+    cache = ResponseCache(str(tmp_path), mode='record')
+    backend = HttpBackend(base_url=server.base_url, pacing=PacingPolicy.none(), cache=cache)
+    try:
+        backend.fetch_page(2000, 1, page_size=1, fresh=True)
+        list(backend.iter_videos(2000))
+        assert server.hits['/x/space/wbi/arc/search'] == 4
+
+        # A rerun of the full crawl is answered from the cache...
+        list(backend.iter_videos(2000))
+        assert server.hits['/x/space/wbi/arc/search'] == 4
+
+        # ...but a probe or an incremental crawl always goes live, and is still recorded
+        backend.fetch_page(2000, 1, page_size=1, fresh=True)
+        mark = HighWaterMark(synthetic_vlist(2000, 75)[3]['bvid'])
+        assert len(list(backend.iter_videos(2000, high_water_mark=mark))) == 3
+        assert server.hits['/x/space/wbi/arc/search'] == 6
+        assert cache.get_json('api/arc_search/2000/1/1') is not None
+    finally:
+        backend.close()
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.fakes import FakeDriver, FakeSite
+from bili_spider.normalize import TS_FORMAT
+from bili_spider.replay import RecordingDriver, ReplayDriver, ResponseCache, reparse
+from bili_spider.spider import get_user_videos, page_url
+from bili_spider.store import get_store
+from bili_spider.waits import PAGE_SIGNATURE_JS, PacingPolicy
+
+
+class UnnumberedDriver(FakeDriver):
+    """A layout whose pager has no numbered active page button"""
+
+    def execute_script(self, script, *args):
+        if script == PAGE_SIGNATURE_JS:
+            return [None, super().execute_script(script, *args)[1]]
+        return super().execute_script(script, *args)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / 'replay'), mode='record')
+
+
+def test_recording_keys_snapshots_on_the_page_being_read(cache):
+    site = FakeSite(2000, 3)
+    browser = RecordingDriver(UnnumberedDriver([site]), cache)
+
+    videos = list(get_user_videos(browser, 2000, progress_callback=lambda *args: None, pacing=PacingPolicy.none()))
+
+    assert len(videos) == 3 * site.per_page
+    assert cache.keys('page/') == ['page/2000/1', 'page/2000/2', 'page/2000/3']
+    replay = ReplayDriver(cache)
+    for pn in (1, 2, 3):
+        replay.get(page_url(2000, pn))
+        assert site.first_bvid(pn) in replay.page_source
+
+
+def test_reparse_keeps_the_recorded_fetch_time(cache, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    site = FakeSite(2000, 1)
+    cache.put_json('page/2000/1', {'url': page_url(2000, 1), 'title': site.title, 'html': site.page(1)[0]})
+    recorded = datetime(2024, 3, 1, 12, 0, 0)
+    with cache._conn() as conn:
+        conn.execute('UPDATE entries SET stored_at = ?', (recorded.timestamp(),))
+
+    reparse(ResponseCache(cache.path, mode='replay'))
+    rows = get_store()._conn().execute(
+        "SELECT pub_date, pub_ts, fetched_at FROM videos WHERE pub_date IN ('3小时前', '07-22')").fetchall()
+
+    assert rows
+    for pub_date, pub_ts, fetched_at in rows:
+        assert fetched_at == recorded.strftime(TS_FORMAT)
+        assert pub_ts == ('2024-03-01 09:00:00' if pub_date == '3小时前' else '2023-07-22 00:00:00')
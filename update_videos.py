@@ -1,17 +1,43 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import os
 import sys
+from bili_spider import metrics
+from bili_spider.replay import ResponseCache
 from bili_spider.updater import update_all_users
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Update videos for all following users")
+    parser.add_argument('--workers', type=int, default=1, help="number of users crawled concurrently, each with its own browser")
+    parser.add_argument('--rpm', type=int, default=20, help="total page requests per minute across all workers")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium', help="read video lists through Chrome or the JSON API (falls back to Chrome)")
+    parser.add_argument('--parallel-pages', type=int, default=1, help="browser sessions per user when crawling a user in full; pages are opened by URL")
+    parser.add_argument('--tabs', action='store_true', help="run the Chrome sessions as tabs of one browser to save memory")
+    parser.add_argument('--lean', action='store_true', help="don't load images, fonts, media or trackers in Chrome")
+    parser.add_argument('--no-probe', action='store_true', help="crawl every user instead of first checking which ones have new videos")
+    parser.add_argument('--probe-workers', type=int, default=8, help="number of users checked for new videos concurrently")
+    parser.add_argument('--cache', choices=['record', 'replay'], help="record every page read to data/replay, or replay a run from it without the network")
+    parser.add_argument('--cache-ttl-hours', type=float, default=24, help="when recording, how long a stored page is served instead of fetched")
+    parser.add_argument('--metrics', action='store_true', help="append phase timings and counters to data/metrics.jsonl and write data/metrics.prom")
+    args = parser.parse_args()
+
     if os.path.exists('data/following.json'):
         with open('data/following.json', 'r', encoding='utf-8') as f:
             following_users = json.load(f)
         
         if following_users:
             print("Starting video update for all following users...")
-            update_all_users(following_users)
+            if args.metrics:
+                run_metrics = metrics.enable()
+            cache = ResponseCache(mode=args.cache, ttl=args.cache_ttl_hours * 3600) if args.cache else None
+            summary = update_all_users(following_users, workers=args.workers, requests_per_minute=args.rpm, backend=args.backend,
+                                       probe=not args.no_probe, probe_workers=args.probe_workers, lean=args.lean,
+                                       parallel_pages=args.parallel_pages, tabs=args.tabs, cache=cache)
+            if args.metrics:
+                run_metrics.write_jsonl(**{k: v for k, v in summary.items() if k != 'results'})
+                run_metrics.write_prometheus()
+                print(f"Metrics written to {metrics.METRICS_JSONL} and {metrics.METRICS_PROM}")
             print("Update completed!")
         else:
             print("No users in following list.")